@@ -0,0 +1,64 @@
+# benchmarks/bench_bulk_insert.py
+# Compare the legacy per-row FAISS insert with VectorStore.add_embeddings.
+#
+#   python -m benchmarks.bench_bulk_insert --chunks 10000
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import temp_store
+from embed.chunk_store import ChunkStore
+
+
+def legacy_add(vs, embeddings, chunks, doc_id, filename, pages):
+    # the pre-bulk add_with_return loop, kept here for comparison
+    # (one add per row; the index is addressed by chunk-store row id)
+    for emb, text in zip(embeddings, chunks):
+        vs.index.add_with_ids(emb.reshape(1, -1), np.array([len(vs.chunks)], dtype=np.int64))
+        vs.chunks.append([text], doc_id, filename, pages)
+
+
+def run(n_chunks: int, repeats: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        vs = temp_store(tmp, lexical=False)
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((n_chunks, vs.emb_dim)).astype(np.float32)
+        chunks = [f"chunk {i}" for i in range(n_chunks)]
+
+        timings = {"per_row": [], "bulk": []}
+        for r in range(repeats):
+            vs.index.reset()
+            vs.chunks = ChunkStore(os.path.join(tmp, f"chunks_row_{r}"))
+            t0 = time.perf_counter()
+            legacy_add(vs, embeddings, chunks, "bench", "bench.pdf", 1)
+            timings["per_row"].append(time.perf_counter() - t0)
+
+            vs.index.reset()
+            vs.chunks = ChunkStore(os.path.join(tmp, f"chunks_bulk_{r}"))
+            t0 = time.perf_counter()
+            vs.add_embeddings(embeddings, chunks, "bench", "bench.pdf", 1)
+            timings["bulk"].append(time.perf_counter() - t0)
+
+    best = {k: min(v) for k, v in timings.items()}
+    return {
+        "chunks": n_chunks,
+        "repeats": repeats,
+        "per_row_s": best["per_row"],
+        "bulk_s": best["bulk"],
+        "per_row_chunks_per_s": n_chunks / best["per_row"],
+        "bulk_chunks_per_s": n_chunks / best["bulk"],
+        "speedup": best["per_row"] / best["bulk"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.chunks, args.repeats), indent=2))
@@ -0,0 +1,79 @@
+# benchmarks/bench_e2e.py
+# End-to-end RAGPipeline.query latency over a synthetic corpus. The stub
+# generator keeps the numbers about retrieval, packing and pipeline overhead;
+# pass --backend to include a real model.
+#
+#   python -m benchmarks.bench_e2e --docs 20 --pages 10 --out data/bench/e2e.json
+
+import argparse
+import random
+import tempfile
+import time
+
+from benchmarks.common import Timer, emit, percentiles, run_info, temp_store
+from benchmarks.corpus import make_text, queries as make_queries
+from embed.chunker import TextChunker
+from rag.pipeline import RAGPipeline
+import config
+
+
+def build_store(tmp, docs, pages, seed):
+    vs = temp_store(tmp)
+    chunker = TextChunker(chunk_size=config.CHUNK_SIZE, overlap=config.CHUNK_OVERLAP)
+    rng = random.Random(seed)
+    for d in range(docs):
+        page_texts = [make_text(rng, 25) for _ in range(pages)]
+        chunks = [c for p, text in enumerate(page_texts, start=1) for c in chunker.chunk_page(text, p)]
+        vs.add_with_return(chunks, f"doc{d}", f"doc{d}.pdf", pages)
+    vs.save()
+    return vs
+
+
+def run(docs, pages, n_queries, top_k, backend, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        with Timer() as t_build:
+            vs = build_store(tmp, docs, pages, seed)
+        rag = RAGPipeline(vs, backend=backend)
+        qs = make_queries(n_queries, seed=seed + 1)
+        rag.query(qs[0], top_k=top_k)  # model loads
+        rag.retrieval_cache.clear()
+        rag.answer_cache.clear()
+
+        def timed_queries():
+            samples = []
+            for q in qs:
+                t0 = time.perf_counter()
+                rag.query(q, top_k=top_k)
+                samples.append(time.perf_counter() - t0)
+            return samples
+
+        # distinct queries are uncached on the first pass and cached on the second
+        cold = timed_queries()
+        warm = timed_queries()
+
+        rag.retrieval_cache.clear()
+        rag.answer_cache.clear()
+        with Timer() as t_batch:
+            rag.query_batch(qs, top_k=top_k)
+
+        return {
+            "benchmark": "e2e",
+            "run": run_info(docs=docs, pages=pages, queries=n_queries, top_k=top_k, backend=backend, seed=seed),
+            "index": {"chunks": len(vs.chunks), "engine": vs.index_engine, "build_s": t_build.seconds},
+            "query_cold": percentiles(cold),
+            "query_cached": percentiles(warm),
+            "query_batch": {"seconds": t_batch.seconds, "qps": n_queries / t_batch.seconds},
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--backend", default="stub")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    emit(run(args.docs, args.pages, args.queries, args.top_k, args.backend, args.seed), args.out)
@@ -0,0 +1,142 @@
+# benchmarks/bench_ingest.py
+# Per-stage ingest throughput on a synthetic corpus: native text extraction,
+# page rendering, OCR, cleaning, chunking, embedding and index insert.
+#
+#   python -m benchmarks.bench_ingest --docs 8 --pages 10 --out data/bench/ingest.json
+
+import argparse
+import os
+import tempfile
+
+import fitz
+import numpy as np
+
+from benchmarks.common import Timer, emit, run_info, temp_store, throughput
+from benchmarks.corpus import make_corpus
+from embed.chunker import TextChunker
+from preprocess.cleaner import TextCleaner
+from preprocess.pdf_reader import PDFReader
+import config
+
+
+def bench_extract(files):
+    reader = PDFReader(mode="text-only")
+    pages, chars = 0, 0
+    texts = []
+    with Timer() as t:
+        for f in files:
+            for _, text in reader.iter_pages(f["path"]):
+                pages += 1
+                chars += len(text)
+                texts.append(text)
+    return texts, {"pages": pages, "seconds": t.seconds, "pages_per_s": throughput(pages, t.seconds),
+                   "chars": chars}
+
+
+def bench_render(files, dpi):
+    reader = PDFReader(dpi=dpi)
+    images = []
+    with Timer() as t:
+        for f in files:
+            with fitz.open(f["path"]) as doc:
+                images.extend(reader.render_page(page) for page in doc)
+    mpix = sum(img.shape[0] * img.shape[1] for img in images) / 1e6
+    return images, {"pages": len(images), "seconds": t.seconds,
+                    "pages_per_s": throughput(len(images), t.seconds), "megapixels": mpix}
+
+
+def bench_ocr(images, dpi):
+    from preprocess.ocr import OCRExtractor
+    ocr = OCRExtractor(cache_path=None)
+    try:
+        # the first page pays for model load; report it separately
+        with Timer() as warm:
+            ocr.extract_pages(images[:1], dpi=dpi)
+        with Timer() as t:
+            texts = ocr.extract_pages(images[1:], dpi=dpi)
+    finally:
+        ocr.close()
+    n = len(images) - 1
+    return {"pages": n, "workers": ocr.workers, "warmup_s": warm.seconds, "seconds": t.seconds,
+            "pages_per_s": throughput(n, t.seconds), "chars": sum(len(x) for x in texts)}
+
+
+def bench_clean(texts):
+    cleaner = TextCleaner()
+    nbytes = sum(len(t.encode("utf-8")) for t in texts)
+    with Timer() as t:
+        cleaned = [cleaner.clean_text(x) for x in texts]
+    return cleaned, {"pages": len(texts), "seconds": t.seconds, "mb_per_s": throughput(nbytes / 1e6, t.seconds)}
+
+
+def bench_chunk(texts):
+    chunker = TextChunker(chunk_size=config.CHUNK_SIZE, overlap=config.CHUNK_OVERLAP)
+    with Timer() as t:
+        chunks = [c.text for p, x in enumerate(texts, start=1) for c in chunker.chunk_page(x, p)]
+    return chunks, {"chunks": len(chunks), "seconds": t.seconds, "chunks_per_s": throughput(len(chunks), t.seconds)}
+
+
+def bench_embed_and_add(chunks, tmp):
+    vs = temp_store(tmp)
+    vs.embed(chunks[:8])  # model load + warmup
+    with Timer() as t_embed:
+        emb = np.asarray(vs.embed(chunks), dtype=np.float32)
+    with Timer() as t_add:
+        vs.add_with_return(chunks, "bench", "bench.pdf", 1, embeddings=emb)
+        vs.save()
+    vs.wait_for_compaction()
+    return {
+        "embed": {"chunks": len(chunks), "seconds": t_embed.seconds,
+                  "chunks_per_s": throughput(len(chunks), t_embed.seconds)},
+        "add_with_return": {"chunks": len(chunks), "seconds": t_add.seconds,
+                            "chunks_per_s": throughput(len(chunks), t_add.seconds), "includes_save": True},
+    }
+
+
+def run(docs, pages, scanned, dpi, corpus_dir=None, skip_ocr=False, skip_embed=False, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = corpus_dir or os.path.join(tmp, "corpus")
+        manifest = make_corpus(corpus_dir, docs, pages, scanned, seed=seed)
+        native = [f for f in manifest["files"] if not f["scanned"]]
+        scans = [f for f in manifest["files"] if f["scanned"]]
+
+        stages = {}
+        texts, stages["pdf_text"] = bench_extract(native)
+        images, stages["render"] = bench_render(scans, dpi)
+        if skip_ocr or len(images) < 2:
+            stages["ocr"] = {"skipped": True}
+        else:
+            try:
+                stages["ocr"] = bench_ocr(images, dpi)
+            except ImportError as e:
+                stages["ocr"] = {"skipped": True, "reason": repr(e)}
+        del images
+        cleaned, stages["clean"] = bench_clean(texts)
+        chunks, stages["chunk"] = bench_chunk(cleaned)
+        if skip_embed:
+            stages["embed"] = stages["add_with_return"] = {"skipped": True}
+        else:
+            stages.update(bench_embed_and_add(chunks, tmp))
+
+    return {
+        "benchmark": "ingest",
+        "run": run_info(docs=docs, pages=pages, scanned=scanned, dpi=dpi, seed=seed),
+        "corpus": {"native_pages": len(native) * pages, "scanned_pages": len(scans) * pages},
+        "stages": stages,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--scanned", type=float, default=0.25)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--corpus", help="write the corpus here instead of a temp dir")
+    parser.add_argument("--skip-ocr", action="store_true")
+    parser.add_argument("--skip-embed", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    emit(run(args.docs, args.pages, args.scanned, args.dpi, args.corpus, args.skip_ocr, args.skip_embed,
+             args.seed), args.out)
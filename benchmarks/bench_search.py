@@ -0,0 +1,103 @@
+# benchmarks/bench_search.py
+# Search latency percentiles and ANN recall@k versus index size and engine.
+# Vectors are random unit vectors so large indexes build quickly; query
+# embedding is timed separately.
+#
+#   python -m benchmarks.bench_search --sizes 1000 10000 200000 --engines flat ivf_flat hnsw --out data/bench/search.json
+
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import emit, percentiles, run_info, temp_store
+from benchmarks.corpus import make_text, queries as make_queries
+import config
+
+
+def unit_vectors(rng, n, dim):
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    v /= np.linalg.norm(v, axis=1, keepdims=True)
+    return v
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def bench_size(size, engine, n_queries, top_k, lexical, seed):
+    rng = np.random.default_rng(seed)
+    text_rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        # add into a flat index, then build `engine` once over every vector:
+        # the store's train threshold would otherwise keep small sizes flat
+        vs = temp_store(tmp, lexical, index_engine="flat")
+        texts = [make_text(text_rng, 3) for _ in range(size)]
+        t0 = time.perf_counter()
+        for start in range(0, size, 50000):
+            part = slice(start, min(start + 50000, size))
+            vs.add_embeddings(unit_vectors(rng, len(texts[part]), vs.emb_dim), texts[part], "bench", "bench.pdf", 1)
+        if engine != "flat":
+            vs.migrate(engine)
+        vs.save()
+        build_s = time.perf_counter() - t0
+
+        qs = make_queries(n_queries, seed=seed + 1)
+        q_embs = unit_vectors(rng, n_queries, vs.emb_dim)
+        vs.search_rows(qs[0], top_k, q_emb=q_embs[:1])  # warmup
+
+        # against an exact search over the same vectors; queries are stored vectors
+        recall = vs.recall_report(k=top_k, n_queries=min(n_queries, 200), seed=seed)
+        result = {
+            "size": size,
+            "engine": recall["engine"],  # the index actually searched
+            "build_s": build_s,
+            "recall": recall["recall"],
+            "dense": percentiles(timed(lambda q, e: vs.search_rows(q, top_k, q_emb=e),
+                                       [(q, q_embs[i:i + 1]) for i, q in enumerate(qs)])),
+        }
+        t0 = time.perf_counter()
+        vs.search_rows_batch(qs, top_k, q_embs=q_embs)
+        result["dense_batch_qps"] = n_queries / (time.perf_counter() - t0)
+        if vs.lexical is not None:
+            result["lexical"] = percentiles(timed(lambda q: vs.lexical_search_rows(q, top_k), [(q,) for q in qs]))
+            result["hybrid"] = percentiles(timed(lambda q, e: vs.hybrid_search_rows(q, top_k, q_emb=e),
+                                                 [(q, q_embs[i:i + 1]) for i, q in enumerate(qs)]))
+        return result
+
+
+def bench_query_embed(n_queries, seed):
+    with tempfile.TemporaryDirectory() as tmp:
+        vs = temp_store(tmp, lexical=False, index_engine="flat")
+        qs = make_queries(n_queries, seed=seed)
+        vs.embed_query(qs[0])  # model load
+        return percentiles(timed(vs.embed_query, [(q,) for q in qs]))
+
+
+def run(sizes, engines, n_queries, top_k, lexical=True, seed=0):
+    return {
+        "benchmark": "search",
+        "run": run_info(sizes=sizes, engines=engines, queries=n_queries, top_k=top_k, lexical=lexical, seed=seed),
+        "query_embed": bench_query_embed(min(n_queries, 200), seed),
+        "by_size": [bench_size(size, engine, n_queries, top_k, lexical, seed) for engine in engines for size in sizes],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 200000])
+    parser.add_argument("--engines", nargs="+", default=[config.INDEX_ENGINE])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--no-lexical", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    emit(run(args.sizes, args.engines, args.queries, args.top_k, not args.no_lexical, args.seed), args.out)
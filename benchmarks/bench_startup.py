@@ -0,0 +1,82 @@
+# benchmarks/bench_startup.py
+# Wall-clock startup of each cli_test.py mode, in a fresh interpreter, and
+# which heavy libraries the mode ended up importing. Modes are run with no
+# file / --doc-id, so they stop right after building their components, and
+# against an empty temporary data dir (DOCINFERX_DATA_DIR), never data/.
+#
+#   python -m benchmarks.bench_startup --repeats 3 --out data/bench/startup.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import emit, run_info
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["faiss", "fitz", "paddleocr", "sentence_transformers", "torch", "transformers"]
+MODES = ["list", "add", "ingest", "delete", "replace", "chat"]
+
+# run cli_test.py as __main__, then report the heavy modules it imported
+_RUNNER = """
+import json, runpy, sys
+sys.argv = ["cli_test.py"] + sys.argv[1:]
+try:
+    runpy.run_path("cli_test.py", run_name="__main__")
+except SystemExit:
+    pass
+print("@@" + json.dumps(sorted(m for m in %r if m in sys.modules)))
+""" % (HEAVY,)
+
+
+def run_mode(mode: str, data_dir: str):
+    env = dict(os.environ, DOCINFERX_DATA_DIR=data_dir)
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _RUNNER, mode],
+        cwd=ROOT, env=env, input="exit\n", capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - t0
+    marker = [line for line in proc.stdout.splitlines() if line.startswith("@@")]
+    return {
+        "seconds": elapsed,
+        "ok": proc.returncode == 0 and bool(marker),
+        "heavy_imports": json.loads(marker[-1][2:]) if marker else None,
+        "stderr_tail": proc.stderr.strip().splitlines()[-1:] if proc.returncode else [],
+    }
+
+
+def summarize(runs):
+    result = {
+        "best_s": min(r["seconds"] for r in runs),
+        "mean_s": sum(r["seconds"] for r in runs) / len(runs),
+        "ok": all(r["ok"] for r in runs),
+        "heavy_imports": runs[-1]["heavy_imports"],
+    }
+    if not result["ok"]:
+        result["error"] = runs[-1]["stderr_tail"]
+    return result
+
+
+def run(modes, repeats: int):
+    out = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        for mode in modes:
+            out[mode] = summarize([run_mode(mode, data_dir) for _ in range(repeats)])
+    return {
+        "benchmark": "startup",
+        "run": run_info(modes=modes, repeats=repeats),
+        "modes": out,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    args = parser.parse_args()
+    emit(run(args.modes, args.repeats), args.out)
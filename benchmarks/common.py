@@ -0,0 +1,85 @@
+# benchmarks/common.py
+# Shared helpers: timing, percentiles, run metadata, JSON output and
+# throwaway VectorStores.
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(samples, ps=(50, 90, 99)) -> dict:
+    """Latency percentiles in milliseconds."""
+    if not len(samples):
+        return {f"p{p}_ms": None for p in ps}
+    arr = np.asarray(samples, dtype=np.float64) * 1000.0
+    out = {f"p{p}_ms": float(np.percentile(arr, p)) for p in ps}
+    out["mean_ms"] = float(arr.mean())
+    return out
+
+
+def throughput(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else float("inf")
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def run_info(**params) -> dict:
+    """What a result needs to be compared with another run."""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embed_model": config.EMBED_MODEL_NAME,
+        "params": params,
+    }
+
+
+def temp_store(tmp: str, lexical: bool = True, **kwargs):
+    """A VectorStore whose index, chunks and lexical index all live under `tmp`."""
+    from embed.vectorizer import VectorStore  # loads faiss; keep it off the import path
+    return VectorStore(
+        model_name=config.EMBED_MODEL_NAME,
+        index_path=os.path.join(tmp, "index.faiss"),
+        index_dir=os.path.join(tmp, "index"),
+        meta_path=os.path.join(tmp, "metadata.npy"),
+        chunk_dir=os.path.join(tmp, "chunks"),
+        lexical_path=os.path.join(tmp, "lexical.sqlite") if lexical else None,
+        **kwargs
+    )
+
+
+def emit(result: dict, out_path: str = None):
+    """Print the result as JSON and, with out_path, also write it there."""
+    text = json.dumps(result, indent=2, default=float)
+    print(text)
+    if out_path:
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
@@ -0,0 +1,116 @@
+# benchmarks/corpus.py
+# Deterministic synthetic corpus: native-text PDFs and rasterized ("scanned")
+# PDFs with no text layer.
+#
+#   python -m benchmarks.corpus data/bench_corpus --docs 10 --pages 20 --scanned 0.3
+
+import argparse
+import json
+import os
+import random
+
+import fitz
+
+_WORDS = (
+    "index vector query document page chunk model latency memory throughput "
+    "cache search result answer context engine table report figure section "
+    "method data value system network storage request response batch token "
+    "policy revenue contract invoice quarter customer product market region"
+).split()
+
+
+def _vocabulary(size: int = 5000):
+    # common words first, then deterministic pseudo-words; sampled with Zipf
+    # weights so term frequencies look like natural text to BM25
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "te", "vo", "zi", "pa", "do", "fe"]
+    rng = random.Random(1234)
+    words = list(_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        w = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        if w not in seen:
+            seen.add(w)
+            words.append(w)
+    weights = [1.0 / (rank + 1) for rank in range(size)]
+    return words, weights
+
+
+_VOCAB, _WEIGHTS = _vocabulary()
+
+
+def make_text(rng: random.Random, n_sentences: int) -> str:
+    sentences = []
+    for _ in range(n_sentences):
+        words = rng.choices(_VOCAB, weights=_WEIGHTS, k=rng.randint(8, 18))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), str(rng.randint(1, 9999)))
+        sentences.append(" ".join(words).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def write_native_pdf(path: str, pages, fontsize: int = 10):
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=fontsize)
+    doc.save(path)
+    doc.close()
+
+
+def write_scanned_pdf(path: str, pages, dpi: int = 150):
+    # render native pages to images and keep only the images
+    native = fitz.open()
+    for text in pages:
+        page = native.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=10)
+    doc = fitz.open()
+    for page in native:
+        pix = page.get_pixmap(dpi=dpi)
+        out = doc.new_page(width=page.rect.width, height=page.rect.height)
+        out.insert_image(out.rect, pixmap=pix)
+    doc.save(path)
+    doc.close()
+    native.close()
+
+
+def make_corpus(out_dir: str, docs: int = 10, pages: int = 10, scanned: float = 0.2,
+                sentences_per_page: int = 25, seed: int = 0) -> dict:
+    """
+    Write `docs` PDFs of `pages` pages into out_dir; a `scanned` fraction of
+    them are image-only. Returns (and stores as manifest.json) the file list.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    n_scanned = int(round(docs * scanned))
+    files = []
+    for d in range(docs):
+        is_scanned = d < n_scanned
+        texts = [make_text(rng, sentences_per_page) for _ in range(pages)]
+        path = os.path.join(out_dir, f"{'scan' if is_scanned else 'native'}_{d:04d}.pdf")
+        if is_scanned:
+            write_scanned_pdf(path, texts)
+        else:
+            write_native_pdf(path, texts)
+        files.append({"path": path, "pages": pages, "scanned": is_scanned,
+                      "chars": sum(len(t) for t in texts)})
+    manifest = {"seed": seed, "docs": docs, "pages": pages, "scanned": n_scanned, "files": files}
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def queries(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(_VOCAB, weights=_WEIGHTS, k=rng.randint(2, 6))) for _ in range(n)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out_dir")
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--scanned", type=float, default=0.2, help="fraction of image-only PDFs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    m = make_corpus(args.out_dir, args.docs, args.pages, args.scanned, seed=args.seed)
+    print(f"[corpus] {m['docs']} PDFs ({m['scanned']} scanned) x {m['pages']} pages -> {args.out_dir}")
@@ -0,0 +1,34 @@
+# benchmarks/run_all.py
+# Run the ingest, search, end-to-end and startup benchmarks with small
+# defaults and write one JSON file per run, named by time and commit, for
+# later comparison.
+#
+#   python -m benchmarks.run_all --out-dir data/bench
+
+import argparse
+import os
+import time
+
+from benchmarks import bench_e2e, bench_ingest, bench_search, bench_startup
+from benchmarks.common import emit, git_commit, run_info
+
+
+def run(quick: bool, skip_ocr: bool):
+    scale = 1 if quick else 4
+    results = {"run": run_info(quick=quick)}
+    results["ingest"] = bench_ingest.run(docs=4 * scale, pages=5 * scale, scanned=0.25, dpi=200, skip_ocr=skip_ocr)
+    sizes = [1000, 10000] if quick else [1000, 10000, 200000]
+    results["search"] = bench_search.run(sizes, engines=["ivf_flat", "hnsw"], n_queries=200, top_k=10)
+    results["e2e"] = bench_e2e.run(docs=5 * scale, pages=5 * scale, n_queries=100, top_k=10, backend="stub")
+    results["startup"] = bench_startup.run(bench_startup.MODES, repeats=1 if quick else 3)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out-dir", default=os.path.join("data", "bench"))
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--skip-ocr", action="store_true")
+    args = parser.parse_args()
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{git_commit()}.json"
+    emit(run(args.quick, args.skip_ocr), os.path.join(args.out_dir, name))
@@ -1,60 +1,144 @@
 # cli_test.py
-import uuid
 import argparse
 from pathlib import Path
 
 from library.manager import DocumentManager
-from embed.vectorizer import VectorStore
-from rag.pipeline import RAGPipeline
 import config
 
 parser = argparse.ArgumentParser()
-parser.add_argument("mode", choices=["add", "chat", "list"])
-parser.add_argument("file", nargs="?")
-args = parser.parse_args()
-
-dm = DocumentManager(config.LIBRARY_META_PATH)
-vs = VectorStore(model_name=config.EMBED_MODEL_NAME, index_path=config.INDEX_PATH, meta_path=config.META_PATH)
-rag = RAGPipeline(vs)
-
-if args.mode == "list":
-    docs = dm.list_documents()
-    if not docs:
-        print("[RAG] No documents.")
-    else:
-        for d in docs:
-            print(f"{d['doc_id']}\n  File:  {d['name']}\n  Pages: {d.get('pages','?')}\n  Chunks:{d.get('chunks',0)}\n")
-    exit()
-
-if args.mode == "add":
-    if not args.file:
-        print("Provide a file path.")
-        exit()
-    fp = Path(args.file)
-    if not fp.exists():
-        print("File not found.")
-        exit()
-    doc_id = str(uuid.uuid4())
-    print(f"[+] Ingesting: {fp.name}")
-    chunks = dm.ingest_document(str(fp), doc_id)
-    # persist chunks to vectorstore
-    stored = vs.add_with_return(chunks, doc_id, fp.name, dm.db.get_all()[-1].get("pages", 1))
-    vs.save()
-    print(f"[+] Ingested {len(stored)} chunks for {fp.name}")
-    exit()
-
-if args.mode == "chat":
-    print("[Chat Mode] Type 'exit' to quit.")
-    while True:
+parser.add_argument("mode", choices=["add", "ingest", "chat", "list", "delete", "replace"])
+parser.add_argument("file", nargs="?", help="file for add/replace, directory or glob for ingest")
+parser.add_argument("--doc-id", help="target document for delete/replace; limits chat to that document")
+parser.add_argument("--pages", help="with chat and --doc-id: only search these pages, e.g. 2,5-7")
+parser.add_argument("--trace", action="store_true", help="write stage spans and a metrics snapshot to data/")
+
+
+def main():
+    # everything runs from here: the OCR pool spawns workers that re-import
+    # this module, and they must not replay the command
+    args = parser.parse_args()
+
+    if args.trace:
+        import atexit
+        from utils.tracing import tracer
+        tracer.configure(enabled=True)
+        atexit.register(tracer.write_metrics)
+        atexit.register(tracer.flush)
+
+    # each mode builds only what it needs; `list` only reads the library metadata
+    if args.mode == "list":
+        dm = DocumentManager(config.LIBRARY_DB_PATH)
+        docs = dm.list_documents()
+        if not docs:
+            print("[RAG] No documents.")
+        else:
+            for d in docs:
+                print(f"{d['doc_id']}\n  File:  {d['name']}\n  Pages: {d.get('pages','?')}\n  Chunks:{d.get('chunks',0)}\n")
+        return
+
+    from embed.vectorizer import VectorStore
+
+    vs = VectorStore(model_name=config.EMBED_MODEL_NAME, index_path=config.INDEX_PATH, index_dir=config.INDEX_DIR,
+                     meta_path=config.META_PATH,
+                     chunk_dir=config.CHUNK_STORE_DIR,
+                     cache_path=config.EMBED_CACHE_PATH, cache_max_bytes=config.EMBED_CACHE_MAX_BYTES)
+    dm = DocumentManager(config.LIBRARY_DB_PATH, vector_store=vs)
+
+    if args.mode == "add":
+        if not args.file:
+            print("Provide a file path.")
+            return
+        fp = Path(args.file)
+        if not fp.exists():
+            print("File not found.")
+            return
+        print(f"[+] Ingesting: {fp.name}")
+        # pages stream through extraction, chunking and embedding into the index;
+        # a file whose content is already in the library is only linked
+        doc_id, stored, duplicate = dm.add_file(str(fp))
+        if duplicate:
+            print(f"[=] {fp.name} is already in the library as {doc_id}; skipped")
+            return
+        print(f"[+] Ingested {stored} chunks for {fp.name}")
+        return
+
+    if args.mode == "ingest":
+        if not args.file:
+            print("Provide a directory or glob pattern.")
+            return
+        from library.bulk import BulkIngestor
+        bulk = BulkIngestor(dm, vs)
+        stats = bulk.run(args.file, on_file=lambda path, status: print(f"[{status}] {path}"))
+        dm.ocr.close()
+        print(
+            f"[+] {stats['ingested']} ingested, {stats['skipped']} already done, "
+            f"{stats['duplicates']} duplicates, {stats['failed']} failed "
+            f"of {stats['found']} files in {stats['seconds']:.1f}s\n"
+            f"    {stats['files_per_sec']:.2f} files/sec, {stats['chunks_per_sec']:.1f} chunks/sec"
+        )
+        return
+
+    if args.mode == "delete":
+        if not args.doc_id:
+            print("Provide --doc-id.")
+            return
+        try:
+            removed = dm.delete_document(args.doc_id)
+        except KeyError:
+            print("Document not found.")
+            return
+        print(f"[-] Deleted {args.doc_id} ({removed} chunks)")
+        return
+
+    if args.mode == "replace":
+        if not args.doc_id or not args.file:
+            print("Provide a file path and --doc-id.")
+            return
+        fp = Path(args.file)
+        if not fp.exists():
+            print("File not found.")
+            return
         try:
-            q = input(">> ").strip()
-            if not q:
-                continue
-            if q.lower() in ("exit", "quit"):
-                print("Exiting...")
+            stored = dm.replace_document(args.doc_id, str(fp))
+        except KeyError:
+            print("Document not found.")
+            return
+        except ValueError as e:
+            print(e)
+            return
+        print(f"[+] Re-indexed {args.doc_id} from {fp.name} ({stored} chunks)")
+        return
+
+    if args.mode == "chat":
+        from rag.pipeline import RAGPipeline
+        rag = RAGPipeline(vs)
+        pages = None
+        if args.pages:
+            pages = []
+            for part in args.pages.split(","):
+                lo, _, hi = part.partition("-")
+                pages.extend(range(int(lo), int(hi or lo) + 1))
+        print("[Chat Mode] Type 'exit' to quit.")
+        while True:
+            try:
+                q = input(">> ").strip()
+                if not q:
+                    continue
+                if q.lower() in ("exit", "quit"):
+                    print("Exiting...")
+                    break
+                print("\n--- Answer ---")
+                for piece in rag.stream_query(q, doc_id=args.doc_id, pages=pages):
+                    print(piece, end="", flush=True)
+                st = rag.last_stream_stats
+                print(f"\n[ttft {st['ttft']:.2f}s | {st['tokens']} tokens | {st['tokens_per_sec']:.1f} tok/s"
+                      f"{' | cached' if st['cached'] else ''}]\n")
+            except TimeoutError:
+                print("\n[Chat] The model stopped responding before the answer was finished. Try again.\n")
+            except KeyboardInterrupt:
+                print("\nExiting...")
                 break
-            ans = rag.query(q)
-            print("\n--- Answer ---\n" + ans + "\n")
-        except KeyboardInterrupt:
-            print("\nExiting...")
-            break
+
+
+if __name__ == "__main__":
+    main()
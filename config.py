@@ -11,14 +11,21 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-DATA_DIR = os.path.join(BASE_DIR, "data")
+# DOCINFERX_DATA_DIR moves every index, cache and upload elsewhere (benchmarks use a temp dir)
+DATA_DIR = os.environ.get("DOCINFERX_DATA_DIR") or os.path.join(BASE_DIR, "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 # FAISS + Metadata store
+INDEX_DIR = os.path.join(DATA_DIR, "index")
+# legacy single-file index; imported into INDEX_DIR on first start
 INDEX_PATH = os.path.join(DATA_DIR, "vector_index.faiss")
+CHUNK_STORE_DIR = os.path.join(DATA_DIR, "chunks")
+# legacy pickled metadata; imported into CHUNK_STORE_DIR on first start
 META_PATH = os.path.join(DATA_DIR, "metadata.npy")
 
 # Library metadata DB
+LIBRARY_DB_PATH = os.path.join(DATA_DIR, "library.sqlite")
+# legacy JSON library; imported into LIBRARY_DB_PATH on first start
 LIBRARY_META_PATH = os.path.join(DATA_DIR, "library_metadata.json")
 
 # Uploaded PDFs/images (optional)
@@ -29,10 +36,19 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # OCR SETTINGS
 
 OCR_LANGS = ["en"]
+# pages handed to an OCR worker per task
 OCR_BATCH_SIZE = 4
+# OCR worker processes (each loads its own PaddleOCR); 1 = OCR in-process
+OCR_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+
+# OCR result cache keyed by page pixels + DPI + language + OCR version (None disables)
+OCR_CACHE_PATH = os.path.join(DATA_DIR, "ocr_cache.sqlite")
+OCR_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
 # For PDFReader (text-based vs OCR)
 PDF_TEXT_MODE = "auto"     # auto / text-only / image-only
+# in auto mode, pages with fewer native text characters than this are OCR'd
+PDF_MIN_PAGE_CHARS = 32
 
 
 # TEXT CLEANING
@@ -47,21 +63,104 @@ CHUNK_SIZE = 600
 CHUNK_OVERLAP = 120
 
 
+# STREAMING INGEST
+
+# pages extracted / OCR'd per step; bounds rendered images held in memory
+INGEST_WINDOW_PAGES = 16
+# chunks embedded and added to the index per batch
+INGEST_EMBED_BATCH = 256
+
+# bulk `ingest` command: extraction threads, files handed ahead of embedding,
+# chunk batches buffered per file being extracted, and the resume checkpoint
+BULK_EXTRACT_WORKERS = 2
+BULK_QUEUE_SIZE = 4
+BULK_FILE_BATCHES = 4
+BULK_CHECKPOINT_PATH = os.path.join(DATA_DIR, "ingest_checkpoint.json")
+
+# background ingest queue (Streamlit uploads): worker threads, and how many
+# finished jobs are kept for status polling
+INGEST_QUEUE_WORKERS = 1
+INGEST_JOB_HISTORY = 100
+
+
 # EMBEDDING MODEL (FAISS)
 
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
+# Content-hash embedding cache (set path to None to disable)
+EMBED_CACHE_PATH = os.path.join(DATA_DIR, "embed_cache.sqlite")
+EMBED_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+# VECTOR INDEX ENGINE
+
+# flat (exact) / ivf_flat / ivf_pq / hnsw
+INDEX_ENGINE = "ivf_flat"
+# stay on the exact flat index until the library has this many chunks
+INDEX_TRAIN_THRESHOLD = 20000
+
+IVF_NLIST = 0          # 0 = auto (~4*sqrt(n))
+IVF_PQ_M = 48          # PQ sub-quantizers (must divide the embedding dim)
+IVF_NPROBE = 16        # default per-query nprobe
+HNSW_M = 32
+HNSW_EF_SEARCH = 64    # default per-query efSearch
+
+# Hybrid retrieval: BM25 inverted index fused with FAISS via reciprocal rank fusion
+LEXICAL_INDEX_PATH = os.path.join(DATA_DIR, "lexical.sqlite")  # None disables
+HYBRID_SEARCH = True
+RRF_K = 60
+
+# Append-only index log: compact into a new base snapshot once the log is
+# at least this big and at least this fraction of the snapshot size
+WAL_COMPACT_MIN_BYTES = 64 * 1024 * 1024
+WAL_COMPACT_RATIO = 0.5
+
 
 # GENERATION MODEL 
 
 GENERATOR_MODEL = "microsoft/phi-2"
 
+# "auto" (hf-4bit with CUDA, else cpu-int8), "hf-4bit", "cpu-int8", "gguf" or "stub"
+GENERATOR_BACKEND = "auto"
+# local GGUF file for the llama.cpp backend
+GGUF_MODEL_PATH = os.path.join(DATA_DIR, "models", "phi-2.Q4_K_M.gguf")
+GGUF_N_CTX = 2048
+# CPU threads for cpu-int8 / gguf; 0 leaves the library default
+GENERATOR_THREADS = 0
+
 MAX_GENERATION_TOKENS = 1024
+# seconds a streaming reader waits for the next piece (the first includes prefill)
+STREAM_TIMEOUT = 120
+
+# Prompt size: retrieved context is packed into CONTEXT_TOKEN_BUDGET tokens
+# (counted with the generator tokenizer); the whole prompt is capped at
+# PROMPT_MAX_TOKENS. Passages sharing this fraction of word 3-grams with a
+# better-ranked one are dropped.
+CONTEXT_TOKEN_BUDGET = 1024
+PROMPT_MAX_TOKENS = 1600
+CONTEXT_DEDUP_THRESHOLD = 0.8
 TEMPERATURE = 0.6
 TOP_P = 0.9
 
 DEVICE = "auto"  
 
+# Batched answering: prompts per generate call
+GENERATE_BATCH_SIZE = 8
+
+# Query caches (entries, seconds); invalidated whenever the index changes
+QUERY_CACHE_SIZE = 512
+QUERY_CACHE_TTL = 3600
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_TTL = 3600
+
+
+# TRACING (utils/tracing.py): spans appended as JSONL, metrics as Prometheus text.
+# Off unless DOCINFERX_TRACE=1 or `cli_test.py --trace`.
+TRACE_ENABLED = os.environ.get("DOCINFERX_TRACE", "0") == "1"
+TRACE_PATH = os.path.join(DATA_DIR, "trace.jsonl")
+METRICS_PATH = os.path.join(DATA_DIR, "metrics.prom")
+TRACE_RSS_INTERVAL = 0.01  # seconds between RSS samples for per-span peaks; 0 samples only start/end
+
 
 # APP METADATA
 
@@ -1,4 +1,17 @@
-from .chunker import TextChunker
-from .vectorizer import VectorStore
+# heavy submodules (faiss, sentence-transformers) are imported on first access
+from importlib import import_module
+
+_LAZY = {
+    "TextChunker": ".chunker",
+    "VectorStore": ".vectorizer",
+}
 
 __all__ = ["TextChunker", "VectorStore"]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,179 @@
+# embed/ann.py
+# Index engines for VectorStore: exact flat L2 plus IVF-Flat, IVF-PQ and HNSW.
+
+import math
+import faiss
+import numpy as np
+
+ENGINES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def _inner(index):
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def is_flat(index) -> bool:
+    return isinstance(_inner(index), faiss.IndexFlat)
+
+
+def engine_of(index) -> str:
+    """Engine of the index as built; a store stays flat below its train threshold."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def empty_index(dim: int):
+    """Fresh exact index addressed by row id."""
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+
+def supports_remove(index) -> bool:
+    # HNSW graphs cannot drop nodes; deleted rows there are filtered at search time
+    return not isinstance(_inner(index), faiss.IndexHNSW)
+
+
+def with_ids(index):
+    """
+    Return an index that accepts explicit ids. Legacy positional flat/HNSW
+    indexes are rewrapped in an IndexIDMap2 keeping row ids 0..n-1.
+    """
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF)):
+        return index
+    n = index.ntotal
+    vectors = index.reconstruct_n(0, n) if n else None
+    index.reset()
+    mapped = faiss.IndexIDMap2(index)
+    if n:
+        mapped.add_with_ids(vectors, np.arange(n, dtype=np.int64))
+    return mapped
+
+
+def index_ids(index) -> np.ndarray:
+    """Every id currently stored in the index."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    if isinstance(index, faiss.IndexIVF):
+        invlists = index.invlists
+        parts = []
+        for l in range(index.nlist):
+            size = invlists.list_size(l)
+            if size:
+                parts.append(faiss.rev_swig_ptr(invlists.get_ids(l), size).copy())
+        return np.concatenate(parts).astype(np.int64) if parts else np.zeros(0, dtype=np.int64)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def ids_and_vectors(index):
+    """
+    (ids, vectors) for every stored entry. vectors is None for IVF-PQ, whose
+    codes cannot be decoded back to the original embeddings.
+    """
+    ids = index_ids(index)
+    if isinstance(index, faiss.IndexIDMap):
+        inner = _inner(index)
+        vectors = inner.reconstruct_n(0, inner.ntotal) if inner.ntotal else np.zeros((0, index.d), dtype=np.float32)
+        return ids, vectors
+    if isinstance(index, faiss.IndexIVFPQ):
+        return ids, None
+    if isinstance(index, faiss.IndexIVFFlat):
+        # IVF-Flat codes are the raw float32 vectors
+        invlists = index.invlists
+        parts = []
+        for l in range(index.nlist):
+            size = invlists.list_size(l)
+            if size:
+                codes = faiss.rev_swig_ptr(invlists.get_codes(l), size * invlists.code_size)
+                parts.append(codes.copy().view(np.float32).reshape(size, index.d))
+        vectors = np.concatenate(parts) if parts else np.zeros((0, index.d), dtype=np.float32)
+        return ids, vectors
+    return ids, index.reconstruct_n(0, index.ntotal)
+
+
+def _nlist_for(n: int, nlist: int) -> int:
+    # nlist <= 0 means "pick for me": ~4*sqrt(n), while keeping >= 39 points per list
+    if nlist <= 0:
+        nlist = int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // 39 or 1))
+
+
+def _pq_m_for(dim: int, m: int) -> int:
+    # PQ sub-quantizers must divide the embedding dimension
+    m = max(1, min(m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(engine: str, dim: int, vectors: np.ndarray, ids: np.ndarray,
+                nlist: int = 0, pq_m: int = 48, hnsw_m: int = 32):
+    """
+    Build (and train, if needed) an index of the given engine, filled with
+    `vectors` under the row ids `ids`.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"[VectorStore] Unknown index engine: {engine}")
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n = len(vectors)
+
+    if engine == "flat":
+        index = empty_index(dim)
+    elif engine == "hnsw":
+        index = faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, hnsw_m))
+    else:
+        nlist = _nlist_for(n, nlist)
+        quantizer = faiss.IndexFlatL2(dim)
+        if engine == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m_for(dim, pq_m), 8)
+        # training on a bounded sample is enough and keeps migration time predictable
+        sample = vectors
+        if n > 256 * nlist:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(n, 256 * nlist, replace=False)]
+        index.train(sample)
+
+    if n:
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+    return index
+
+
+def search_params(index, nprobe: int = None, ef_search: int = None, ids=None):
+    """
+    Per-query search parameters for `index.search(..., params=...)`, or None.
+    `ids` restricts the search to those ids.
+    """
+    sel = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64)) if ids is not None else None
+    extra = {"sel": sel} if sel is not None else {}
+    if isinstance(index, faiss.IndexIVF) and (nprobe or sel is not None):
+        params = faiss.SearchParametersIVF(nprobe=int(nprobe or index.nprobe), **extra)
+    elif isinstance(_inner(index), faiss.IndexHNSW) and (ef_search or sel is not None):
+        params = faiss.SearchParametersHNSW(efSearch=int(ef_search or _inner(index).hnsw.efSearch), **extra)
+    elif sel is not None:
+        params = faiss.SearchParameters(sel=sel)
+    else:
+        return None
+    # the params object does not own the selector
+    params._sel = sel
+    return params
+
+
+def recall_at_k(approx_ids: np.ndarray, exact_ids: np.ndarray, k: int) -> float:
+    """
+    Mean fraction of the exact top-k neighbours that the approximate search returned.
+    """
+    hits = 0
+    for a, e in zip(approx_ids[:, :k], exact_ids[:, :k]):
+        truth = set(int(i) for i in e if i >= 0)
+        hits += len(truth.intersection(int(i) for i in a if i >= 0))
+    total = sum(int((e[:k] >= 0).sum()) for e in exact_ids)
+    return hits / total if total else 1.0
@@ -0,0 +1,53 @@
+# embed/cache.py
+import hashlib
+import re
+import unicodedata
+
+import numpy as np
+
+from utils.disk_cache import DiskLRUCache
+
+
+def normalize_chunk(text: str) -> str:
+    # same text modulo unicode forms / whitespace must hit the same entry
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache keyed by (model name, normalized text hash).
+    """
+
+    def __init__(self, path: str, model_name: str, max_bytes: int):
+        self.model_name = model_name
+        self.store = DiskLRUCache(path, max_bytes)
+
+    def key(self, text: str) -> str:
+        h = hashlib.sha256()
+        h.update(self.model_name.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(normalize_chunk(text).encode("utf-8"))
+        return h.hexdigest()
+
+    def lookup(self, keys):
+        """Return {key: float32 vector} for cached keys."""
+        raw = self.store.get_many(keys)
+        return {k: np.frombuffer(v, dtype=np.float32) for k, v in raw.items()}
+
+    def insert(self, keys, vectors):
+        self.store.put_many(
+            (k, np.ascontiguousarray(v, dtype=np.float32).tobytes())
+            for k, v in zip(keys, vectors)
+        )
+
+    @property
+    def hits(self):
+        return self.store.hits
+
+    @property
+    def misses(self):
+        return self.store.misses
+
+    def stats(self) -> dict:
+        return self.store.stats()
@@ -0,0 +1,291 @@
+# embed/chunk_store.py
+# Columnar, memory-mapped store for chunk metadata (one row per FAISS vector).
+#
+# Layout of the store directory:
+#   text.bin   utf-8 chunk texts, back to back
+#   text.off   int64 end offset of each row's text in text.bin
+#   doc.i32    int32 row -> index into docs.jsonl
+#   page.i32   int32 row -> page number (0 = unknown)
+#   start.i32  int32 row -> start offset of the chunk in its page text (-1 = unknown)
+#   end.i32    int32 row -> end offset of the chunk in its page text (-1 = unknown)
+#   docs.jsonl one JSON object per document slot (slot, doc_id, filename, pages,
+#              deleted); a later line for the same slot overrides earlier ones
+
+import json
+import os
+
+import numpy as np
+
+
+class ChunkStore:
+    COLUMNS = {
+        "text.off": np.int64,
+        "doc.i32": np.int32,
+        "page.i32": np.int32,
+        "start.i32": np.int32,
+        "end.i32": np.int32,
+    }
+    # columns added after the first release, back-filled with -1 for old stores
+    FILLED = ("start.i32", "end.i32")
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self.docs = []
+        self.doc_index = {}
+        docs_path = self._file("docs.jsonl")
+        if os.path.exists(docs_path):
+            with open(docs_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        doc = json.loads(line)
+                    except ValueError:
+                        break  # torn last line
+                    slot = doc.pop("slot", len(self.docs))
+                    if slot >= len(self.docs):
+                        self.docs.extend({} for _ in range(slot + 1 - len(self.docs)))
+                    self.docs[slot] = doc
+                    if doc.get("deleted"):
+                        if self.doc_index.get(doc["doc_id"]) == slot:
+                            del self.doc_index[doc["doc_id"]]
+                    else:
+                        self.doc_index[doc["doc_id"]] = slot
+
+        self._dirty_docs = []
+        self._pending_text = []
+        self._pending_doc = []
+        self._pending_page = []
+        self._pending_span = []
+        self._maps = None
+
+        self._backfill()
+        self._recover()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _column_len(self, name):
+        p = self._file(name)
+        if not os.path.exists(p):
+            return 0
+        return os.path.getsize(p) // np.dtype(self.COLUMNS[name]).itemsize
+
+    def _backfill(self):
+        n = self._column_len("text.off")
+        for name in self.FILLED:
+            missing = n - self._column_len(name)
+            if missing > 0 and not os.path.exists(self._file(name)):
+                np.full(n, -1, dtype=self.COLUMNS[name]).tofile(self._file(name))
+
+    def _recover(self):
+        # text.off is written last on flush, so it defines how many rows are complete
+        n = min(self._column_len(name) for name in self.COLUMNS)
+        blob_size = os.path.getsize(self._file("text.bin")) if os.path.exists(self._file("text.bin")) else 0
+        if n:
+            offsets = np.fromfile(self._file("text.off"), dtype=np.int64, count=n)
+            while n and offsets[n - 1] > blob_size:
+                n -= 1
+        self._flushed = n
+        self._truncate_files(n)
+
+    def _truncate_files(self, n):
+        end = 0
+        if n:
+            end = int(np.fromfile(self._file("text.off"), dtype=np.int64, count=n)[-1])
+        for name, dtype in self.COLUMNS.items():
+            p = self._file(name)
+            with open(p, "ab") as f:
+                f.truncate(n * np.dtype(dtype).itemsize)
+        with open(self._file("text.bin"), "ab") as f:
+            f.truncate(end)
+        self._maps = None
+
+    def _mapped(self):
+        if self._maps is None or self._maps["n"] != self._flushed:
+            maps = {"n": self._flushed}
+            if self._flushed:
+                for name, dtype in self.COLUMNS.items():
+                    maps[name] = np.memmap(self._file(name), dtype=dtype, mode="r", shape=(self._flushed,))
+                end = int(maps["text.off"][-1])
+                maps["text.bin"] = np.memmap(self._file("text.bin"), dtype=np.uint8, mode="r", shape=(end,)) if end else b""
+            self._maps = maps
+        return self._maps
+
+    def __len__(self):
+        return self._flushed + len(self._pending_text)
+
+    def _doc_slot(self, doc_id, filename, pages):
+        slot = self.doc_index.get(doc_id)
+        if slot is None:
+            # a re-ingested doc_id gets a fresh slot; the deleted one stays dead
+            slot = len(self.docs)
+            self.docs.append({"doc_id": doc_id, "filename": filename, "pages": pages})
+            self.doc_index[doc_id] = slot
+            self._dirty_docs.append(slot)
+        return slot
+
+    def rows_for_doc(self, doc_id) -> np.ndarray:
+        """Row ids of the live document `doc_id` (empty if unknown)."""
+        slot = self.doc_index.get(doc_id)
+        if slot is None:
+            return np.zeros(0, dtype=np.int64)
+        rows = []
+        if self._flushed:
+            rows.append(np.flatnonzero(self._mapped()["doc.i32"] == slot))
+        if self._pending_doc:
+            pending = np.flatnonzero(np.asarray(self._pending_doc, dtype=np.int32) == slot)
+            rows.append(pending + self._flushed)
+        return np.concatenate(rows).astype(np.int64) if rows else np.zeros(0, dtype=np.int64)
+
+    def delete_doc(self, doc_id) -> bool:
+        """Tombstone a document; its rows stop being live. Persisted by flush()."""
+        slot = self.doc_index.pop(doc_id, None)
+        if slot is None:
+            return False
+        self.docs[slot]["deleted"] = True
+        self._dirty_docs.append(slot)
+        return True
+
+    def live_mask(self, rows) -> np.ndarray:
+        """Vectorized is_live() for an array of row ids."""
+        rows = np.asarray(rows, dtype=np.int64)
+        slots = np.empty(len(rows), dtype=np.int64)
+        flushed = rows < self._flushed
+        if flushed.any():
+            slots[flushed] = self._mapped()["doc.i32"][rows[flushed]]
+        if (~flushed).any():
+            pending = np.asarray(self._pending_doc, dtype=np.int64)
+            slots[~flushed] = pending[rows[~flushed] - self._flushed]
+        deleted = np.fromiter((d.get("deleted", False) for d in self.docs), dtype=bool, count=len(self.docs))
+        return ~deleted[slots]
+
+    def is_live(self, row: int) -> bool:
+        if row >= self._flushed:
+            slot = self._pending_doc[row - self._flushed]
+        else:
+            slot = int(self._mapped()["doc.i32"][row])
+        return not self.docs[slot].get("deleted", False)
+
+    def append(self, texts, doc_id, filename, pages, page_numbers=None, spans=None):
+        """
+        Buffer rows for `texts`; they are persisted by flush(). `spans` gives
+        each chunk's (start, end) character offsets in its page text.
+        """
+        slot = self._doc_slot(doc_id, filename, pages)
+        texts = list(texts)
+        if page_numbers is None:
+            page_numbers = [0] * len(texts)
+        if spans is None:
+            spans = [(-1, -1)] * len(texts)
+        self._pending_text.extend(t.encode("utf-8") for t in texts)
+        self._pending_doc.extend([slot] * len(texts))
+        self._pending_page.extend(page_numbers)
+        self._pending_span.extend(spans)
+
+    def flush(self):
+        """Append buffered rows to the column files. Cost is proportional to the new rows."""
+        if self._dirty_docs:
+            with open(self._file("docs.jsonl"), "a", encoding="utf-8") as f:
+                for slot in dict.fromkeys(self._dirty_docs):
+                    f.write(json.dumps(dict(self.docs[slot], slot=slot)) + "\n")
+            self._dirty_docs = []
+
+        if not self._pending_text:
+            return
+
+        base = 0
+        if self._flushed:
+            base = int(self._mapped()["text.off"][-1])
+        lengths = np.fromiter((len(t) for t in self._pending_text), dtype=np.int64, count=len(self._pending_text))
+        offsets = base + np.cumsum(lengths)
+
+        with open(self._file("text.bin"), "ab") as f:
+            f.write(b"".join(self._pending_text))
+        with open(self._file("doc.i32"), "ab") as f:
+            f.write(np.asarray(self._pending_doc, dtype=np.int32).tobytes())
+        with open(self._file("page.i32"), "ab") as f:
+            f.write(np.asarray(self._pending_page, dtype=np.int32).tobytes())
+        spans = np.asarray(self._pending_span, dtype=np.int32).reshape(-1, 2)
+        with open(self._file("start.i32"), "ab") as f:
+            f.write(np.ascontiguousarray(spans[:, 0]).tobytes())
+        with open(self._file("end.i32"), "ab") as f:
+            f.write(np.ascontiguousarray(spans[:, 1]).tobytes())
+        with open(self._file("text.off"), "ab") as f:
+            f.write(offsets.tobytes())
+
+        self._flushed += len(self._pending_text)
+        self._pending_text, self._pending_doc, self._pending_page, self._pending_span = [], [], [], []
+        self._maps = None
+
+    def truncate(self, n):
+        """Drop every row from `n` on (used to realign with the index after a crash)."""
+        if n >= len(self):
+            return
+        if n >= self._flushed:
+            keep = n - self._flushed
+            del self._pending_text[keep:], self._pending_doc[keep:], self._pending_page[keep:]
+            del self._pending_span[keep:]
+            return
+        self._pending_text, self._pending_doc, self._pending_page, self._pending_span = [], [], [], []
+        self._flushed = n
+        self._truncate_files(n)
+
+    def text(self, row: int) -> str:
+        if row >= self._flushed:
+            return self._pending_text[row - self._flushed].decode("utf-8")
+        maps = self._mapped()
+        offsets = maps["text.off"]
+        start = int(offsets[row - 1]) if row else 0
+        return bytes(maps["text.bin"][start:int(offsets[row])]).decode("utf-8")
+
+    def get(self, row: int) -> dict:
+        """Materialize a single row as a metadata dict."""
+        if row >= self._flushed:
+            i = row - self._flushed
+            slot, page = self._pending_doc[i], self._pending_page[i]
+            start, end = self._pending_span[i]
+        else:
+            maps = self._mapped()
+            slot, page = int(maps["doc.i32"][row]), int(maps["page.i32"][row])
+            start, end = int(maps["start.i32"][row]), int(maps["end.i32"][row])
+        doc = self.docs[slot]
+        return {
+            "doc_id": doc["doc_id"],
+            "text": self.text(row),
+            "filename": doc["filename"],
+            "pages": doc["pages"],
+            "page": page,
+            "start": start,
+            "end": end,
+        }
+
+    def rows_for_pages(self, doc_id, pages) -> np.ndarray:
+        """Row ids of the live document `doc_id` that lie on any of `pages`."""
+        rows = self.rows_for_doc(doc_id)
+        if not len(rows):
+            return rows
+        wanted = np.asarray(sorted(set(int(p) for p in pages)), dtype=np.int32)
+        page_of = np.empty(len(rows), dtype=np.int32)
+        flushed = rows < self._flushed
+        if flushed.any():
+            page_of[flushed] = self._mapped()["page.i32"][rows[flushed]]
+        if (~flushed).any():
+            pending = np.asarray(self._pending_page, dtype=np.int32)
+            page_of[~flushed] = pending[rows[~flushed] - self._flushed]
+        return rows[np.isin(page_of, wanted)]
+
+    def iter_texts(self):
+        for row in range(len(self)):
+            yield self.text(row)
+
+    def import_legacy(self, meta_path: str):
+        """One-time import of the old pickled metadata.npy list of dicts."""
+        rows = np.load(meta_path, allow_pickle=True).tolist()
+        for m in rows:
+            self.append([m.get("text", "")], m.get("doc_id", ""), m.get("filename", ""), m.get("pages", 0))
+        self.flush()
+        return len(rows)
@@ -1,11 +1,31 @@
 # embed/chunker.py
 import re
-from typing import List
+from typing import List, NamedTuple
+
+
+class Chunk(NamedTuple):
+    text: str
+    page: int   # 1-based page number, 0 = unknown
+    start: int  # character offsets of text in the page text: page_text[start:end] == text
+    end: int
+
+
+_PAGE_MARKER = re.compile(r"###\s*PAGE\s*(\d+)\s*###", re.IGNORECASE)
+_SENTENCE_ENDS = (". ", "? ", "! ", ".\n", "?\n", "!\n", "\n")
+
 
 class TextChunker:
+    """
+    Single-pass, offset-preserving chunker. Windows of about `chunk_size`
+    characters end at the last sentence end in their back half (else the
+    last whitespace); the next window repeats up to `overlap` characters,
+    starting at a sentence (else word) start. Each step scans only its own
+    window, so cost is linear in the text length.
+    """
+
     def __init__(self, chunk_size: int = 600, overlap: int = 120):
         self.chunk_size = chunk_size
-        self.overlap = overlap
+        self.overlap = min(overlap, chunk_size // 2)
 
     def clean_spaces(self, text: str) -> str:
         # preserve newlines for page boundaries, collapse multiple newlines to one
@@ -13,49 +33,64 @@ class TextChunker:
         text = re.sub(r"\n{2,}", "\n\n", text)
         return text.strip()
 
-    def _sliding_chunks(self, text: str) -> List[str]:
-        text = re.sub(r"\s+", " ", text).strip()
-        if not text:
-            return []
-        chunks = []
-        start = 0
-        length = len(text)
-        while start < length:
-            end = start + self.chunk_size
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            start = start + self.chunk_size - self.overlap
-        return chunks
+    def _cut(self, text: str, lo: int, hi: int) -> int:
+        best = max(text.rfind(end, lo, hi + 1) for end in _SENTENCE_ENDS)
+        if best >= lo:
+            return best + 1
+        space = max(text.rfind(" ", lo, hi), text.rfind("\t", lo, hi))
+        return space if space > lo else hi
 
-    def split(self, text: str) -> List[str]:
-        text = self.clean_spaces(text)
-        if not text:
-            return []
-
-        # If pages present, split per page first
-        if "### PAGE" in text.upper() or "### Page" in text:
-            # split on markers like ### PAGE 1 ### (case-insensitive)
-            parts = re.split(r"(?:###\s*PAGE\s*\d+\s*###)", text, flags=re.IGNORECASE)
-            # re.split keeps separators out; we reconstruct pages by looking for markers
-            pages = []
-            # Try to find markers with findall to align pages
-            markers = re.findall(r"(###\s*PAGE\s*\d+\s*###)", text, flags=re.IGNORECASE)
-            # If markers count matches parts-1: then assemble
-            # parts example: ['', 'content1', 'content2', ...] -> align
-            idx = 0
-            for p in parts:
-                p = p.strip()
-                if p:
-                    pages.append(p)
-            # for each page, either treat as single chunk or further chunk if long
-            out_chunks = []
-            for page_text in pages:
-                if len(page_text) <= self.chunk_size:
-                    out_chunks.append(page_text)
+    def chunk_page(self, text: str, page: int = 0) -> List[Chunk]:
+        """Chunk one page's text; offsets are relative to `text`."""
+        out = []
+        n = len(text)
+        pos = 0
+        while pos < n and text[pos].isspace():
+            pos += 1
+        while pos < n:
+            end = pos + self.chunk_size
+            if end >= n:
+                end = n
+            else:
+                end = self._cut(text, pos + self.chunk_size // 2, end)
+            stop = end
+            while stop > pos and text[stop - 1].isspace():
+                stop -= 1
+            if stop > pos:
+                out.append(Chunk(text[pos:stop], page, pos, stop))
+            if end >= n:
+                break
+            nxt = end - self.overlap
+            if nxt <= pos:
+                nxt = end
+            elif not text[nxt - 1].isspace():
+                # overlap with whole trailing sentences when one starts in the
+                # overlap region, else start on a word boundary
+                found = [i for i in (text.find(e, nxt, end - 1) for e in _SENTENCE_ENDS) if i != -1]
+                if found:
+                    nxt = min(found) + 1
                 else:
-                    out_chunks.extend(self._sliding_chunks(page_text))
-            return out_chunks
+                    space = text.find(" ", nxt, end)
+                    nxt = space + 1 if space != -1 else end
+            while nxt < n and text[nxt].isspace():
+                nxt += 1
+            pos = nxt
+        return out
 
-        # otherwise sliding-window on whole text
-        return self._sliding_chunks(text)
+    def chunk(self, text: str, page: int = 0) -> List[Chunk]:
+        """
+        Chunk a page, or a whole document with '### PAGE n ###' markers: page
+        numbers come from the markers and offsets are relative to each
+        page's text (the text between its marker and the next).
+        """
+        out = []
+        prev_end, prev_page = 0, page
+        for m in _PAGE_MARKER.finditer(text):
+            if m.start() > prev_end:
+                out.extend(self.chunk_page(text[prev_end:m.start()], prev_page))
+            prev_end, prev_page = m.end(), int(m.group(1))
+        out.extend(self.chunk_page(text[prev_end:] if prev_end else text, prev_page))
+        return out
+
+    def split(self, text: str) -> List[str]:
+        return [c.text for c in self.chunk(text)]
@@ -0,0 +1,349 @@
+# embed/lexical.py
+# On-disk inverted index with BM25 scoring over chunk text.
+
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+import numpy as np
+
+_STRIP = re.compile(r"[^a-z0-9.]")
+
+
+def tokenize(text: str):
+    # mirrors TextCleaner: identifiers like "INV-2023/07" index as "inv202307"
+    out = []
+    for word in text.lower().split():
+        word = _STRIP.sub("", word).strip(".")
+        if word:
+            out.append(word)
+    return out
+
+
+class BM25Index:
+    """
+    Postings are kept per term as packed numpy arrays (row ids and term
+    frequencies) in a few blocks each, so a query term costs one indexed read
+    and a vectorised score instead of one Python tuple per posting. Chunk
+    lengths live in memory; removed rows are masked out at query time and
+    purged from the blocks when those are merged.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_df_ratio: float = 0.5,
+                 merge_at: int = 8):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        # terms in more than this share of chunks are skipped when the query has
+        # rarer terms: their idf is near zero but their posting lists are the longest
+        self.max_df_ratio = max_df_ratio
+        self.merge_at = merge_at  # blocks a term may collect before its small ones are merged
+        self._lock = threading.Lock()
+        self._touched = set()  # terms with blocks added since the last commit
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'postings'").fetchone():
+            # one row per posting (older layout): start empty, the VectorStore re-indexes its chunks
+            print("[BM25Index] Old posting layout found; rebuilding the index.")
+            self.conn.executescript(
+                """
+                DROP TABLE postings;
+                DELETE FROM terms;
+                DELETE FROM lengths;
+                DELETE FROM stats;
+                """
+            )
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS blocks (
+                id INTEGER PRIMARY KEY, term TEXT NOT NULL, n INTEGER NOT NULL,
+                max_row INTEGER NOT NULL, rows BLOB NOT NULL, tfs BLOB NOT NULL);
+            CREATE INDEX IF NOT EXISTS blocks_term ON blocks(term);
+            CREATE INDEX IF NOT EXISTS blocks_max_row ON blocks(max_row);
+            CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS lengths (row INTEGER PRIMARY KEY, length INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stats VALUES ('docs', 0), ('tokens', 0), ('removed', 0);
+            """
+        )
+        self.conn.commit()
+        self.n_docs, self.n_tokens, self._removed = self._load_stats()
+        self._lengths = np.zeros(0, dtype=np.int32)
+        # blocks per term, so commit() knows which terms need merging without asking SQLite
+        self._blocks = Counter(dict(self.conn.execute("SELECT term, COUNT(*) FROM blocks GROUP BY term")))
+        stored = self.conn.execute("SELECT row, length FROM lengths").fetchall()
+        if stored:
+            self._set_lengths(np.asarray(stored, dtype=np.int64))
+
+    def _load_stats(self):
+        rows = dict(self.conn.execute("SELECT key, value FROM stats").fetchall())
+        return rows.get("docs", 0), rows.get("tokens", 0), rows.get("removed", 0)
+
+    def _store_stats(self):
+        self.conn.executemany(
+            "UPDATE stats SET value = ? WHERE key = ?",
+            [(self.n_docs, "docs"), (self.n_tokens, "tokens"), (self._removed, "removed")]
+        )
+
+    def _set_lengths(self, pairs):
+        """pairs: int array of (row, length); a length of 0 marks the row absent."""
+        top = int(pairs[:, 0].max()) + 1
+        if top > len(self._lengths):
+            grown = np.zeros(max(top, 2 * len(self._lengths)), dtype=np.int32)
+            grown[:len(self._lengths)] = self._lengths
+            self._lengths = grown
+        self._lengths[pairs[:, 0]] = pairs[:, 1]
+
+    def _live(self, rows):
+        inside = rows < len(self._lengths)
+        inside[inside] = self._lengths[rows[inside]] > 0
+        return inside
+
+    @staticmethod
+    def _unpack(blobs):
+        rows = np.concatenate([np.frombuffer(r, dtype=np.int64) for r, _ in blobs])
+        tfs = np.concatenate([np.frombuffer(t, dtype=np.int32) for _, t in blobs])
+        return rows, tfs
+
+    def _live_postings(self, term):
+        """(rows, tfs) of the term's postings in rows that are still indexed."""
+        blobs = self.conn.execute("SELECT rows, tfs FROM blocks WHERE term = ?", (term,)).fetchall()
+        if not blobs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        rows, tfs = self._unpack(blobs)
+        live = self._live(rows)
+        return rows[live], tfs[live]
+
+    def _insert_block(self, term, rows, tfs):
+        self.conn.execute(
+            "INSERT INTO blocks (term, n, max_row, rows, tfs) VALUES (?, ?, ?, ?, ?)",
+            (term, len(rows), int(rows.max()), rows.astype(np.int64).tobytes(), tfs.astype(np.int32).tobytes())
+        )
+
+    def add(self, rows, texts):
+        """Index chunk texts under new row ids. Call commit() to persist."""
+        postings, lengths = {}, []
+        for row, text in zip(rows, texts):
+            counts = Counter(tokenize(text))
+            row = int(row)
+            lengths.append((row, sum(counts.values())))
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = ([], [])
+                entry[0].append(row)
+                entry[1].append(tf)
+        if not lengths:
+            return
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO blocks (term, n, max_row, rows, tfs) VALUES (?, ?, ?, ?, ?)",
+                ((term, len(r), max(r), np.asarray(r, dtype=np.int64).tobytes(), np.asarray(tf, dtype=np.int32).tobytes())
+                 for term, (r, tf) in postings.items())
+            )
+            self.conn.executemany(
+                "INSERT INTO terms VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                ((term, len(r)) for term, (r, _) in postings.items())
+            )
+            self.conn.executemany("INSERT OR REPLACE INTO lengths VALUES (?, ?)", lengths)
+            self._set_lengths(np.asarray(lengths, dtype=np.int64))
+            self._blocks.update(postings.keys())
+            self._touched.update(postings)
+            self.n_docs += len(lengths)
+            self.n_tokens += sum(n for _, n in lengths)
+            self._store_stats()
+
+    def remove(self, rows):
+        """
+        Drop rows from the index. Call commit() to persist. Their postings
+        stay in the blocks, masked out, until the next merge or compaction.
+        """
+        rows = [int(r) for r in rows]
+        if not rows:
+            return
+        with self._lock:
+            for i in range(0, len(rows), 500):
+                part = rows[i:i + 500]
+                marks = ",".join("?" * len(part))
+                removed = self.conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM lengths WHERE row IN ({marks})", part
+                ).fetchone()
+                self.conn.execute(f"DELETE FROM lengths WHERE row IN ({marks})", part)
+                self.n_docs -= removed[0]
+                self.n_tokens -= removed[1]
+                self._removed += removed[0]
+            rows = np.asarray(rows, dtype=np.int64)
+            self._lengths[rows[rows < len(self._lengths)]] = 0
+            self._store_stats()
+
+    def remove_from(self, first_row: int):
+        """Drop every row >= first_row (realignment after a crash); those ids are reused."""
+        with self._lock:
+            removed = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM lengths WHERE row >= ?", (first_row,)
+            ).fetchone()
+            if not removed[0] and not self.conn.execute(
+                    "SELECT 1 FROM blocks WHERE max_row >= ? LIMIT 1", (first_row,)).fetchone():
+                return
+            self.conn.execute("DELETE FROM lengths WHERE row >= ?", (first_row,))
+            self.n_docs -= removed[0]
+            self.n_tokens -= removed[1]
+            # unlike remove(), purge the postings now: masking cannot tell old rows from new ones
+            stale = self.conn.execute(
+                "SELECT id, term, rows, tfs FROM blocks WHERE max_row >= ?", (first_row,)
+            ).fetchall()
+            for block_id, term, rows, tfs in stale:
+                rows, tfs = self._unpack([(rows, tfs)])
+                keep = rows < first_row
+                self.conn.execute("DELETE FROM blocks WHERE id = ?", (block_id,))
+                if keep.any():
+                    self._insert_block(term, rows[keep], tfs[keep])
+                else:
+                    self._blocks[term] -= 1
+                self.conn.execute("UPDATE terms SET df = df - ? WHERE term = ?", (int((~keep).sum()), term))
+            self.conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._lengths = self._lengths[:first_row].copy()
+            self._store_stats()
+
+    def max_row(self) -> int:
+        with self._lock:
+            row = self.conn.execute("SELECT MAX(row) FROM lengths").fetchone()[0]
+        return -1 if row is None else int(row)
+
+    def _block_sizes(self, terms=None):
+        """{term: [(block id, postings)] smallest first}, for `terms` or every term."""
+        found = {}
+        if terms is None:
+            parts = [self.conn.execute("SELECT term, id, n FROM blocks ORDER BY n")]
+        else:
+            terms = list(terms)
+            parts = (
+                self.conn.execute(
+                    f"SELECT term, id, n FROM blocks WHERE term IN ({','.join('?' * len(terms[i:i + 500]))}) ORDER BY n",
+                    terms[i:i + 500]
+                ) for i in range(0, len(terms), 500)
+            )
+        for cursor in parts:
+            for term, block_id, n in cursor:
+                found.setdefault(term, []).append((block_id, n))
+        return found
+
+    def _merge(self, term, blocks, everything=False):
+        """
+        Merge the term's smallest blocks until each block is larger than all
+        smaller ones together (so a term keeps O(log n) blocks), dropping
+        removed rows on the way. `everything` merges all of them.
+        """
+        take, total = 0, 0
+        for i, (_, n) in enumerate(blocks):
+            if everything or n <= total:
+                take = i + 1
+            total += n
+        if take < 2 and not (everything and blocks):
+            return
+        ids = [block_id for block_id, _ in blocks[:take]]
+        marks = ",".join("?" * len(ids))
+        rows, tfs = self._unpack(self.conn.execute(f"SELECT rows, tfs FROM blocks WHERE id IN ({marks})", ids).fetchall())
+        keep = self._live(rows)
+        if len(ids) == 1 and keep.all():
+            return
+        self.conn.execute(f"DELETE FROM blocks WHERE id IN ({marks})", ids)
+        self._blocks[term] -= len(ids)
+        if keep.any():
+            order = np.argsort(rows[keep], kind="stable")
+            self._insert_block(term, rows[keep][order], tfs[keep][order])
+            self._blocks[term] += 1
+        if not keep.all():
+            self.conn.execute("UPDATE terms SET df = df - ? WHERE term = ?", (int((~keep).sum()), term))
+
+    def compact(self):
+        """Rewrite every term as a single block without removed rows."""
+        with self._lock:
+            for term, blocks in self._block_sizes().items():
+                self._merge(term, blocks, everything=True)
+            self.conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._removed = 0
+            self._store_stats()
+            self._touched.clear()
+            self.conn.commit()
+
+    def commit(self):
+        with self._lock:
+            touched, self._touched = self._touched, set()
+            # let a few small blocks pile up first: merging on every commit
+            # would rewrite the same short lists over and over
+            crowded = [term for term in touched if self._blocks[term] > self.merge_at]
+            for term, blocks in self._block_sizes(crowded).items():
+                self._merge(term, blocks)
+            self.conn.execute("DELETE FROM terms WHERE df <= 0")
+            self.conn.commit()
+            # masked postings skew df and cost scan time: drop them once they are a quarter of the index
+            needs_compact = self._removed > max(1000, self.n_docs // 4)
+        if needs_compact:
+            self.compact()
+
+    def search(self, query: str, top_k: int = 10, rows=None):
+        """Return [(row, bm25_score)] best first, optionally only among `rows`."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or self.n_docs == 0:
+            return []
+        avg_len = self.n_tokens / self.n_docs
+        allowed = np.asarray(rows, dtype=np.int64) if rows is not None else None
+        all_rows, all_scores = [], []
+        with self._lock:
+            marks = ",".join("?" * len(terms))
+            stored = dict(self.conn.execute(f"SELECT term, df FROM terms WHERE term IN ({marks})", terms).fetchall())
+            # stored df still counts postings of removed rows (at most one per removed
+            # row) until they are purged, so only a term common even without those is
+            # skipped unread; every other term is judged by its live df
+            common = self.max_df_ratio * self.n_docs
+            postings = {t: self._live_postings(t) for t, df in stored.items() if df - self._removed <= common}
+            postings = {t: p for t, p in postings.items() if len(p[0])}
+            rare = {t: p for t, p in postings.items() if len(p[0]) <= common}
+            if rare:
+                postings = rare
+            else:
+                for t in stored.keys() - postings.keys():
+                    term_rows, tf = self._live_postings(t)
+                    if len(term_rows):
+                        postings[t] = (term_rows, tf)
+            for term_rows, tf in postings.values():
+                df = len(term_rows)
+                if allowed is not None:
+                    keep = np.isin(term_rows, allowed)
+                    term_rows, tf = term_rows[keep], tf[keep]
+                idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+                tf = tf.astype(np.float64)
+                length = self._lengths[term_rows]
+                all_rows.append(term_rows)
+                all_scores.append(idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len)))
+        if not all_rows:
+            return []
+
+        # sum per-term contributions per row id, then partial-sort for the top k
+        scores = np.bincount(np.concatenate(all_rows), weights=np.concatenate(all_scores))
+        hit = np.flatnonzero(scores)
+        if len(hit) > top_k:
+            hit = hit[np.argpartition(-scores[hit], top_k)[:top_k]]
+        hit = hit[np.argsort(-scores[hit], kind="stable")]
+        return [(int(r), float(scores[r])) for r in hit]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """Fuse several ranked row lists into [(row, rrf_score)], best first."""
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
@@ -1,85 +1,535 @@
 # embed/vectorizer.py
 import os
+import threading
+import time
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from embed.cache import EmbeddingCache
+from embed.chunk_store import ChunkStore
+from embed.chunker import Chunk
+from embed.wal import IndexLog
+from embed.lexical import BM25Index, reciprocal_rank_fusion
+from embed import ann
+from utils.rwlock import RWLock
+from utils.tracing import tracer
+import config
 
 class VectorStore:
     def __init__(
         self,
         model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
         index_path: str = "vector_index.faiss",
-        meta_path: str = "metadata.npy"
+        index_dir: str = config.INDEX_DIR,
+        meta_path: str = "metadata.npy",
+        chunk_dir: str = config.CHUNK_STORE_DIR,
+        cache_path: str = None,
+        lexical_path: str = config.LEXICAL_INDEX_PATH,
+        cache_max_bytes: int = 512 * 1024 * 1024,
+        index_engine: str = config.INDEX_ENGINE,
+        train_threshold: int = config.INDEX_TRAIN_THRESHOLD,
+        nlist: int = config.IVF_NLIST,
+        pq_m: int = config.IVF_PQ_M,
+        hnsw_m: int = config.HNSW_M,
+        nprobe: int = config.IVF_NPROBE,
+        ef_search: int = config.HNSW_EF_SEARCH,
+        compact_min_bytes: int = config.WAL_COMPACT_MIN_BYTES,
+        compact_ratio: float = config.WAL_COMPACT_RATIO
     ):
-        # SentenceTransformer device safe init
-        try:
-            self.model = SentenceTransformer(model_name, device="cuda")
-        except Exception:
-            self.model = SentenceTransformer(model_name, device="cpu")
+        if index_engine not in ann.ENGINES:
+            raise ValueError(f"[VectorStore] Unknown index engine: {index_engine}")
+
+        # the embedding model loads on first use; an existing index supplies emb_dim
+        self.model_name = model_name
+        self._model = None
+        self._emb_dim = None
+
+        self.index_path = index_path  # legacy single-file index, imported once into index_dir
+        self.meta_path = meta_path  # legacy pickled metadata, imported once into the chunk store
+
+        # content-hash embedding cache (optional)
+        self.cache = EmbeddingCache(cache_path, model_name, cache_max_bytes) if cache_path else None
 
-        self.index_path = index_path
-        self.meta_path = meta_path
+        # index engine: starts exact (flat) and migrates once the corpus is large enough
+        self.index_engine = index_engine
+        self.train_threshold = train_threshold
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
 
-        self.emb_dim = self.model.get_sentence_embedding_dimension()
+        # chunk metadata lives in a columnar store; rows are read lazily on search
+        self.chunks = ChunkStore(chunk_dir)
+        if len(self.chunks) == 0 and os.path.exists(self.meta_path):
+            n = self.chunks.import_legacy(self.meta_path)
+            os.replace(self.meta_path, self.meta_path + ".migrated")
+            print(f"[VectorStore] Imported {n} rows from legacy {os.path.basename(self.meta_path)}.")
+
+        # index = base snapshot + append-only log; save() only writes what was added
+        self.log = IndexLog(index_dir)
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_ratio = compact_ratio
+        # searches share the read side; adds, deletes, saves and migrations
+        # take the write side, so a search sees the index and chunk store together
+        self._lock = RWLock()
+        self._pending = []
+        # bumped on every change to what a search can return; used for cache invalidation
+        self.generation = 0
+        self._snapshot_due = False
+        self._compactor = None
+
+        if self.log.exists():
+            cpu_index = self.log.load(lambda dim: ann.empty_index(dim or self.emb_dim))
+        elif os.path.exists(self.index_path):
+            cpu_index = ann.with_ids(faiss.read_index(self.index_path))
+            self.log.write_snapshot(faiss.serialize_index(cpu_index), self.log.seq)
+            os.replace(self.index_path, self.index_path + ".migrated")
+            print(f"[VectorStore] Imported legacy index {os.path.basename(self.index_path)}.")
+        else:
+            cpu_index = ann.empty_index(self.emb_dim)
+        self._emb_dim = cpu_index.d
+
+        # vectors are addressed by chunk-store row id
+        stored_ids = ann.index_ids(cpu_index)
 
         # Try GPU resources; fall back to CPU index if unavailable
         try:
             self.gpu_res = faiss.StandardGpuResources()
-            if os.path.exists(self.index_path) and os.path.exists(self.meta_path):
-                cpu_index = faiss.read_index(self.index_path)
-                self.index = faiss.index_cpu_to_gpu(self.gpu_res, 0, cpu_index)
-                self.metadata = np.load(self.meta_path, allow_pickle=True).tolist()
-            else:
-                cpu_index = faiss.IndexFlatL2(self.emb_dim)
-                self.index = faiss.index_cpu_to_gpu(self.gpu_res, 0, cpu_index)
-                self.metadata = []
         except Exception:
-            # fallback to CPU index
-            if os.path.exists(self.index_path):
-                self.index = faiss.read_index(self.index_path)
-                self.metadata = np.load(self.meta_path, allow_pickle=True).tolist() if os.path.exists(self.meta_path) else []
-            else:
-                self.index = faiss.IndexFlatL2(self.emb_dim)
-                self.metadata = []
+            self.gpu_res = None
+        self.index = self._to_device(cpu_index)
 
-    def embed(self, texts):
+        # rows flushed without a matching index write (interrupted save) are dropped
+        self.chunks.truncate(int(stored_ids.max()) + 1 if len(stored_ids) else 0)
+
+        # deleted rows still physically present (HNSW cannot remove them)
+        self._dead = int((~self.chunks.live_mask(stored_ids)).sum()) if len(stored_ids) else 0
+
+        # BM25 inverted index over the same row ids (optional)
+        self.lexical = BM25Index(lexical_path) if lexical_path else None
+        if self.lexical is not None:
+            self._sync_lexical()
+
+        self._maybe_migrate()
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            # SentenceTransformer device safe init
+            try:
+                self._model = SentenceTransformer(self.model_name, device="cuda")
+            except Exception:
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+            if self._emb_dim is not None and self._emb_dim != self._model.get_sentence_embedding_dimension():
+                raise ValueError(
+                    f"[VectorStore] Index dimension {self._emb_dim} does not match model {self.model_name}"
+                )
+        return self._model
+
+    @property
+    def emb_dim(self):
+        if self._emb_dim is None:
+            self._emb_dim = self.model.get_sentence_embedding_dimension()
+        return self._emb_dim
+
+    def _sync_lexical(self):
+        # the lexical index commits after the log, so after a crash it can lag
+        # behind (re-index the tail) or hold rows that were truncated away
+        self.lexical.remove_from(len(self.chunks))
+        start = self.lexical.max_row() + 1
+        if start < len(self.chunks):
+            rows = np.arange(start, len(self.chunks), dtype=np.int64)
+            rows = rows[self.chunks.live_mask(rows)]
+            for i in range(0, len(rows), 1000):
+                part = rows[i:i + 1000]
+                self.lexical.add(part, [self.chunks.text(int(r)) for r in part])
+        self.lexical.commit()
+
+    def _to_cpu(self, index):
+        try:
+            return faiss.index_gpu_to_cpu(index)
+        except Exception:
+            return index
+
+    def _to_device(self, index):
+        if self.gpu_res is None:
+            return index
+        try:
+            return faiss.index_cpu_to_gpu(self.gpu_res, 0, index)
+        except Exception:
+            # HNSW and some IVF variants have no GPU implementation
+            return index
+
+    def _maybe_migrate(self):
+        cpu_index = self._to_cpu(self.index)
+        if self.index_engine == "flat" or not ann.is_flat(cpu_index):
+            return
+        if cpu_index.ntotal < self.train_threshold:
+            return
+        self.migrate()
+
+    def migrate(self, engine: str = None):
+        """
+        Rebuild the current index as `engine` (default: the configured engine),
+        keeping vector order so metadata rows stay aligned.
+        """
+        engine = engine or self.index_engine
+        with self._lock.write():
+            cpu_index = self._to_cpu(self.index)
+            print(f"[VectorStore] Migrating {cpu_index.ntotal} vectors to '{engine}' index...")
+            ids, vectors = self._live_vectors(cpu_index)
+            new_index = ann.build_index(
+                engine, self.emb_dim, vectors, ids,
+                nlist=self.nlist, pq_m=self.pq_m, hnsw_m=self.hnsw_m
+            )
+            self.index = self._to_device(new_index)
+            self.index_engine = engine
+            self._dead = 0
+            self.generation += 1
+            # replaying the log onto the old base would redo the migration; snapshot on next save
+            self._snapshot_due = True
+
+    def _live_vectors(self, cpu_index):
+        ids, vectors = ann.ids_and_vectors(cpu_index)
+        if len(ids):
+            live = self.chunks.live_mask(ids)
+            ids = ids[live]
+            if vectors is not None:
+                vectors = vectors[live]
+        if vectors is None:
+            # PQ codes are lossy; re-embed the stored text (mostly cache hits)
+            vectors = np.asarray(self.embed([self.chunks.text(int(i)) for i in ids]), dtype=np.float32)
+        return ids, np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.emb_dim)
+
+    def _encode(self, texts):
         return self.model.encode(texts, batch_size=32, show_progress_bar=False)
 
-    def add_with_return(self, chunks, doc_id, filename, pages):
-        embeddings = self.embed(chunks)
-        stored = []
-        for emb, text in zip(embeddings, chunks):
-            self.index.add(emb.reshape(1, -1))
-            self.metadata.append({
-                "doc_id": doc_id,
-                "text": text,
-                "filename": filename,
-                "pages": pages
-            })
-            stored.append(text)
-        return stored
-
-    def search(self, query, top_k=5):
-        q_emb = self.embed([query])
+    def embed(self, texts):
+        texts = list(texts)
+        with tracer.span("embed", texts=len(texts)):
+            tracer.count("embedded_texts", len(texts))
+            return self._embed(texts)
+
+    def _embed(self, texts):
+        if self.cache is None or not texts:
+            tracer.count("encoded_texts", len(texts))
+            return self._encode(texts)
+
+        keys = [self.cache.key(t) for t in texts]
+        found = self.cache.lookup(keys)
+
+        # encode each missing text once, even if repeated within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        tracer.count("encoded_texts", len(missing))
+        if missing:
+            fresh = np.asarray(self._encode(list(missing.values())), dtype=np.float32)
+            self.cache.insert(list(missing.keys()), fresh)
+            found.update(zip(missing.keys(), fresh))
+
+        out = np.empty((len(texts), self.emb_dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            out[i] = found[key]
+        return out
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+
+    def add_embeddings(self, embeddings, chunks, doc_id, filename, pages, page_numbers=None, spans=None):
+        """
+        Bulk insert: one contiguous float32 add for the whole batch.
+        `page_numbers` optionally gives the source page of each chunk and
+        `spans` its (start, end) character offsets in that page's text.
+        """
+        chunks = list(chunks)
+        if not chunks:
+            return []
+        emb = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(chunks), self.emb_dim)
+        with tracer.span("index.add", chunks=len(chunks)), self._lock.write():
+            ids = np.arange(len(self.chunks), len(self.chunks) + len(chunks), dtype=np.int64)
+            self.index.add_with_ids(emb, ids)
+            self.chunks.append(chunks, doc_id, filename, pages, page_numbers=page_numbers, spans=spans)
+            if self.lexical is not None:
+                self.lexical.add(ids, chunks)
+            self._pending.append((ids, emb))
+            self.generation += 1
+            self._maybe_migrate()
+        return chunks
+
+    def delete_document(self, doc_id) -> int:
+        """
+        Remove every chunk of `doc_id` from the index. Returns the number of
+        rows removed; persisted by the next save().
+        """
+        with self._lock.write():
+            rows = self.chunks.rows_for_doc(doc_id)
+            if not self.chunks.delete_doc(doc_id):
+                return 0
+            if len(rows):
+                removed = False
+                if ann.supports_remove(self._to_cpu(self.index)):
+                    try:
+                        self.index.remove_ids(faiss.IDSelectorBatch(rows))
+                        removed = True
+                    except RuntimeError:
+                        pass
+                if not removed:
+                    self._dead += len(rows)
+                if self.lexical is not None:
+                    self.lexical.remove(rows)
+                self._pending.append((rows, None))
+            self.generation += 1
+            return len(rows)
+
+    def add_with_return(self, chunks, doc_id, filename, pages, embeddings=None, page_numbers=None, spans=None):
+        chunks = list(chunks)
+        if chunks and isinstance(chunks[0], Chunk):
+            page_numbers = [c.page for c in chunks]
+            spans = [(c.start, c.end) for c in chunks]
+            chunks = [c.text for c in chunks]
+        if embeddings is None:
+            embeddings = self.embed(chunks) if chunks else None
+        return self.add_embeddings(
+            embeddings, chunks, doc_id, filename, pages, page_numbers=page_numbers, spans=spans
+        )
+
+    def add_batches(self, batches, doc_id, filename, pages):
+        """
+        Ingest an iterable of chunk batches. Each batch is a list of chunk
+        texts or Chunk records, a (chunks, embeddings) pair, or a (chunks,
+        embeddings, page_numbers) triple; embeddings may be None to compute
+        them here. Returns the number of chunks stored.
+        """
+        total = 0
+        for batch in batches:
+            embeddings = page_numbers = None
+            if isinstance(batch, tuple):
+                chunks, embeddings = batch[0], batch[1]
+                if len(batch) > 2:
+                    page_numbers = batch[2]
+            else:
+                chunks = batch
+            total += len(self.add_with_return(
+                chunks, doc_id, filename, pages, embeddings=embeddings, page_numbers=page_numbers
+            ))
+        return total
+
+    def scope_rows(self, doc_id=None, pages=None):
+        """Rows a scoped search may return: None for the whole store, else an id array."""
+        if doc_id is None:
+            return None
+        if pages is None:
+            return self.chunks.rows_for_doc(doc_id)
+        return self.chunks.rows_for_pages(doc_id, pages)
+
+    def _search_vectors(self, q_emb, top_k, nprobe=None, ef_search=None, ids=None):
+        params = ann.search_params(
+            self.index,
+            nprobe=nprobe or self.nprobe,
+            ef_search=ef_search or self.ef_search,
+            ids=ids
+        )
+        q_emb = np.ascontiguousarray(q_emb, dtype=np.float32)
+        if params is not None:
+            return self.index.search(q_emb, top_k, params=params)
+        return self.index.search(q_emb, top_k)
+
+    def embed_query(self, query):
+        return self.embed_queries([query])
+
+    def embed_queries(self, queries):
+        return np.asarray(self.embed(queries), dtype=np.float32)
+
+    def search_rows(self, query, top_k=5, nprobe=None, ef_search=None, q_emb=None, doc_id=None, pages=None):
+        """
+        Dense retrieval as [(row, L2 distance)], nearest first. `doc_id` and
+        `pages` restrict the search to one document, or to some of its pages.
+        """
+        return self.search_rows_batch([query], top_k, nprobe, ef_search, q_embs=q_emb, doc_id=doc_id, pages=pages)[0]
+
+    def search_rows_batch(self, queries, top_k=5, nprobe=None, ef_search=None, q_embs=None,
+                          doc_id=None, pages=None):
+        """search_rows for many queries with one encode call and one index search."""
+        if not len(queries):
+            return []
+        if q_embs is None:
+            q_embs = self.embed_queries(queries)
+        with self._lock.read():
+            return self._search_rows_batch(queries, top_k, nprobe, ef_search, q_embs, doc_id, pages)
+
+    def _search_rows_batch(self, queries, top_k, nprobe, ef_search, q_embs, doc_id, pages):
+        scope = self.scope_rows(doc_id, pages)
+        if scope is not None and not len(scope):
+            return [[] for _ in queries]
+        # over-fetch while deleted rows are still physically in the index
+        fetch_k = top_k * 4 if self._dead else top_k
+        if scope is not None:
+            # scoped rows are live; probe every list / widen the graph walk,
+            # since the filter skips most of what would normally be visited
+            fetch_k = min(top_k, len(scope))
+            nprobe = getattr(self.index, "nlist", None) or nprobe
+            ef_search = max(ef_search or self.ef_search, min(len(scope), 1024))
         try:
-            distances, indices = self.index.search(q_emb, top_k)
+            with tracer.span("search.dense", queries=len(queries), k=fetch_k, scoped=scope is not None):
+                try:
+                    distances, indices = self._search_vectors(q_embs, fetch_k, nprobe, ef_search, ids=scope)
+                except RuntimeError:
+                    if scope is None:
+                        raise
+                    # GPU indexes take no id selector: search wide and filter below
+                    distances, indices = self._search_vectors(q_embs, min(self.index.ntotal, 2048), nprobe, ef_search)
         except Exception:
             # empty index or cpu/gpu mismatch -> return empty
+            return [[] for _ in queries]
+        allowed = set(scope.tolist()) if scope is not None else None
+        out = []
+        for q_indices, q_distances in zip(indices, distances):
+            results = []
+            for idx, dist in zip(q_indices, q_distances):
+                if allowed is not None and idx not in allowed:
+                    continue
+                if 0 <= idx < len(self.chunks) and self.chunks.is_live(int(idx)):
+                    results.append((int(idx), float(dist)))
+            out.append(results[:top_k])
+        return out
+
+    def search(self, query, top_k=5, nprobe=None, ef_search=None):
+        q_emb = self.embed_query(query)
+        with self._lock.read():
+            hits = self.search_rows(query, top_k, nprobe, ef_search, q_emb=q_emb)
+            return [(self.chunks.text(row), dist) for row, dist in hits]
+
+    def lexical_search_rows(self, query, top_k=5, doc_id=None, pages=None):
+        """BM25 retrieval as [(row, score)], best first."""
+        if self.lexical is None:
             return []
-        results = []
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx < len(self.metadata):
-                results.append((self.metadata[idx]["text"], float(dist)))
-        return results
+        with self._lock.read():
+            scope = self.scope_rows(doc_id, pages)
+            if scope is not None and not len(scope):
+                return []
+            with tracer.span("search.lexical"):
+                hits = self.lexical.search(query, top_k=top_k * 2 if self._dead else top_k, rows=scope)
+            hits = [(row, score) for row, score in hits if row < len(self.chunks) and self.chunks.is_live(row)]
+        return hits[:top_k]
+
+    def hybrid_search_rows(self, query, top_k=5, candidates=None, rrf_k=config.RRF_K, q_emb=None,
+                           doc_id=None, pages=None):
+        """Dense and BM25 rankings fused with reciprocal rank fusion: [(row, rrf score)]."""
+        return self.hybrid_search_rows_batch(
+            [query], top_k, candidates, rrf_k, q_embs=q_emb, doc_id=doc_id, pages=pages
+        )[0]
+
+    def hybrid_search_rows_batch(self, queries, top_k=5, candidates=None, rrf_k=config.RRF_K, q_embs=None,
+                                 doc_id=None, pages=None):
+        candidates = candidates or max(top_k * 4, 20)
+        if q_embs is None:
+            q_embs = self.embed_queries(queries)
+        # both rankings come from the same state of the store
+        with self._lock.read():
+            dense = self.search_rows_batch(queries, candidates, q_embs=q_embs, doc_id=doc_id, pages=pages)
+            out = []
+            for query, dense_hits in zip(queries, dense):
+                lexical = [row for row, _ in self.lexical_search_rows(query, candidates, doc_id=doc_id, pages=pages)]
+                out.append(reciprocal_rank_fusion([[row for row, _ in dense_hits], lexical], k=rrf_k)[:top_k])
+        return out
+
+    def hybrid_search(self, query, top_k=5, candidates=None, rrf_k=config.RRF_K):
+        q_emb = self.embed_query(query)
+        with self._lock.read():
+            hits = self.hybrid_search_rows(query, top_k, candidates, rrf_k, q_emb=q_emb)
+            return [(self.chunks.text(row), score) for row, score in hits]
+
+    def recall_report(self, k=10, n_queries=100, nprobe=None, ef_search=None, seed=0):
+        """
+        Compare the live index against an exact flat index over the same vectors.
+        Queries are sampled from the stored vectors.
+        """
+        with self._lock.read():
+            cpu_index = self._to_cpu(self.index)
+            engine = ann.engine_of(cpu_index)
+            ids, vectors = self._live_vectors(cpu_index)
+        n = len(ids)
+        if n == 0:
+            return {"engine": engine, "vectors": 0, "k": k, "recall": 1.0}
+        exact = ann.empty_index(self.emb_dim)
+        exact.add_with_ids(vectors, ids)
+
+        rng = np.random.default_rng(seed)
+        queries = vectors[rng.choice(n, min(n_queries, n), replace=False)]
+
+        t0 = time.perf_counter()
+        _, approx_ids = self._search_vectors(queries, k, nprobe, ef_search)
+        approx_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        _, exact_ids = exact.search(queries, k)
+        exact_s = time.perf_counter() - t0
+
+        return {
+            "engine": engine,
+            "vectors": n,
+            "k": k,
+            "queries": len(queries),
+            "nprobe": nprobe or self.nprobe,
+            "ef_search": ef_search or self.ef_search,
+            "recall": ann.recall_at_k(approx_ids, exact_ids, k),
+            "approx_ms_per_query": 1000 * approx_s / len(queries),
+            "exact_ms_per_query": 1000 * exact_s / len(queries),
+        }
+
+    def get_chunk(self, row: int) -> dict:
+        with self._lock.read():
+            return self.chunks.get(row)
+
+    def reading(self):
+        """Hold the read lock, e.g. while turning search hits into chunk texts."""
+        return self._lock.read()
 
     def save(self):
-        try:
-            # if GPU index, convert to CPU for write
-            cpu_index = faiss.index_gpu_to_cpu(self.index)
-            faiss.write_index(cpu_index, self.index_path)
-        except Exception:
-            try:
-                faiss.write_index(self.index, self.index_path)
-            except Exception:
-                pass
-        np.save(self.meta_path, np.array(self.metadata, dtype=object))
+        """
+        Persist what was added since the last save: new chunk rows and one log
+        record per added batch. Compaction into a new base snapshot runs in a
+        background thread once the log grows large relative to the snapshot.
+        """
+        with tracer.span("vectorstore.save"), self._lock.write():
+            self.chunks.flush()
+            for ids, vectors in self._pending:
+                if vectors is None:
+                    self.log.append_remove(ids)
+                else:
+                    self.log.append_add(ids, vectors)
+            self._pending = []
+            if self.lexical is not None:
+                self.lexical.commit()
+            # rebuild once tombstoned rows make up a noticeable share of the index
+            if self._dead and self._dead > 0.1 * self.index.ntotal:
+                self.migrate(self.index_engine)
+            if self._snapshot_due or self.log.needs_compaction(self.compact_min_bytes, self.compact_ratio):
+                self.compact()
+
+    def compact(self, wait: bool = False):
+        """
+        Fold the log into a new base snapshot. The index is serialized under the
+        lock; writing it out happens in a background thread.
+        """
+        with self._lock.write():
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            # only logged vectors may go into the snapshot
+            if self._pending:
+                return
+            data = faiss.serialize_index(self._to_cpu(self.index))
+            seq = self.log.seq
+            self._snapshot_due = False
+            self._compactor = threading.Thread(
+                target=self.log.write_snapshot, args=(data, seq), name="vectorstore-compact"
+            )
+            self._compactor.start()
+        if wait:
+            self._compactor.join()
+
+    def wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
@@ -0,0 +1,204 @@
+# embed/wal.py
+# Append-only persistence for the FAISS index: a base snapshot plus a
+# write-ahead log of the vectors added (and ids removed) since that snapshot.
+#
+# Layout of the index directory:
+#   base-<seq>.faiss  full index snapshot containing every record up to <seq>
+#   wal.log           records appended after the snapshot
+#
+# Each log record is  header | ids (int64) | vectors (float32) | crc32.
+
+import glob
+import os
+import re
+import struct
+import threading
+import zlib
+
+import faiss
+import numpy as np
+
+from embed import ann
+
+MAGIC = b"DXWL"
+HEADER = struct.Struct("<4sBQQI")  # magic, kind, seq, count, dim
+CRC = struct.Struct("<I")
+
+ADD = 1
+REMOVE = 2
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class IndexLog:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.wal_path = os.path.join(path, "wal.log")
+        self.seq = 0
+        self.base_seq = 0
+        self._lock = threading.Lock()
+
+    def _bases(self):
+        found = []
+        for p in glob.glob(os.path.join(self.path, "base-*.faiss")):
+            m = re.match(r"base-(\d+)\.faiss$", os.path.basename(p))
+            if m:
+                found.append((int(m.group(1)), p))
+        return sorted(found)
+
+    @property
+    def wal_bytes(self) -> int:
+        return os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+
+    @property
+    def base_bytes(self) -> int:
+        bases = self._bases()
+        return os.path.getsize(bases[-1][1]) if bases else 0
+
+    def exists(self) -> bool:
+        return bool(self._bases()) or self.wal_bytes > 0
+
+    def load(self, make_index):
+        """
+        Recover the index: newest base snapshot (if any) replayed with every
+        intact log record after it. Without a snapshot, `make_index(dim)` builds
+        the empty index; dim comes from the first logged vectors, or is None
+        when nothing was ever logged. A torn tail left by a crash is cut off.
+        """
+        index = None
+        bases = self._bases()
+        if bases:
+            self.base_seq, base_path = bases[-1]
+            index = faiss.read_index(base_path)
+        self.seq = self.base_seq
+
+        if not os.path.exists(self.wal_path):
+            return index if index is not None else make_index(None)
+
+        good_end = 0
+        replayed = 0
+        with open(self.wal_path, "rb") as f:
+            while True:
+                record = self._read_record(f)
+                if record is None:
+                    break
+                kind, seq, ids, vectors = record
+                good_end = f.tell()
+                if seq <= self.base_seq:
+                    continue  # already folded into the snapshot
+                if index is None:
+                    index = make_index(vectors.shape[1] if kind == ADD else None)
+                if kind == ADD:
+                    index.add_with_ids(vectors, ids)
+                elif ann.supports_remove(index):
+                    index.remove_ids(faiss.IDSelectorBatch(ids))
+                self.seq = seq
+                replayed += 1
+
+        if good_end < self.wal_bytes:
+            print(f"[IndexLog] Dropping {self.wal_bytes - good_end} bytes of incomplete log tail.")
+            with open(self.wal_path, "r+b") as f:
+                f.truncate(good_end)
+        if replayed:
+            print(f"[IndexLog] Replayed {replayed} log record(s) after snapshot {self.base_seq}.")
+        return index if index is not None else make_index(None)
+
+    def _read_record(self, f):
+        head = f.read(HEADER.size)
+        if len(head) < HEADER.size:
+            return None
+        magic, kind, seq, count, dim = HEADER.unpack(head)
+        if magic != MAGIC:
+            return None
+        ids_size = count * 8
+        vec_size = count * dim * 4 if kind == ADD else 0
+        body = f.read(ids_size + vec_size)
+        tail = f.read(CRC.size)
+        if len(body) < ids_size + vec_size or len(tail) < CRC.size:
+            return None
+        if zlib.crc32(head + body) != CRC.unpack(tail)[0]:
+            return None
+        ids = np.frombuffer(body[:ids_size], dtype=np.int64)
+        vectors = np.frombuffer(body[ids_size:], dtype=np.float32).reshape(count, dim) if vec_size else None
+        return kind, seq, ids, vectors
+
+    def append_add(self, ids, vectors):
+        """Durably log a batch of added vectors. Returns the record sequence number."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return self._append(ADD, ids, vectors.shape[1], vectors.tobytes())
+
+    def append_remove(self, ids):
+        """Durably log removed ids. Returns the record sequence number."""
+        return self._append(REMOVE, ids, 0, b"")
+
+    def _append(self, kind, ids, dim, payload):
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        with self._lock:
+            self.seq += 1
+            head = HEADER.pack(MAGIC, kind, self.seq, len(ids), dim)
+            body = ids.tobytes() + payload
+            with open(self.wal_path, "ab") as f:
+                f.write(head + body + CRC.pack(zlib.crc32(head + body)))
+                f.flush()
+                os.fsync(f.fileno())
+            return self.seq
+
+    def needs_compaction(self, min_bytes: int, ratio: float) -> bool:
+        wal = self.wal_bytes
+        return wal >= min_bytes and wal >= ratio * self.base_bytes
+
+    def write_snapshot(self, index_bytes, seq: int):
+        """
+        Install `index_bytes` (a serialized index covering records <= seq) as the
+        new base and drop those records from the log.
+        """
+        final = os.path.join(self.path, f"base-{seq:012d}.faiss")
+        tmp = final + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(index_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, final)
+        _fsync_dir(self.path)
+
+        with self._lock:
+            # keep only records newer than the snapshot
+            kept = []
+            if os.path.exists(self.wal_path):
+                with open(self.wal_path, "rb") as f:
+                    while True:
+                        start = f.tell()
+                        record = self._read_record(f)
+                        if record is None:
+                            break
+                        if record[1] > seq:
+                            end = f.tell()
+                            f.seek(start)
+                            kept.append(f.read(end - start))
+            tmp_wal = self.wal_path + ".tmp"
+            with open(tmp_wal, "wb") as f:
+                f.write(b"".join(kept))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_wal, self.wal_path)
+            _fsync_dir(self.path)
+            self.base_seq = seq
+
+        for old_seq, old_path in self._bases():
+            if old_seq < seq:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
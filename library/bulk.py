@@ -0,0 +1,208 @@
+# library/bulk.py
+# Bulk directory ingestion with pipelined stages and a resumable checkpoint.
+
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from library.manager import file_hash
+import config
+
+SUPPORTED_EXTS = (".pdf", ".png", ".jpg", ".jpeg")
+
+_DONE = object()
+
+
+def expand_inputs(target: str):
+    """A directory (searched recursively) or a glob pattern -> sorted file list."""
+    if os.path.isdir(target):
+        paths = []
+        for root, _, files in os.walk(target):
+            paths.extend(os.path.join(root, f) for f in files)
+    else:
+        paths = glob.glob(target, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(SUPPORTED_EXTS))
+
+
+class Checkpoint:
+    """
+    Per-file progress, keyed by absolute path + size + mtime so an edited
+    file is ingested again. Rewritten atomically after every file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(file_path: str) -> str:
+        st = os.stat(file_path)
+        return f"{os.path.abspath(file_path)}|{st.st_size}|{int(st.st_mtime)}"
+
+    def is_done(self, file_path: str) -> bool:
+        return self.entries.get(self.key(file_path), {}).get("status") == "done"
+
+    def mark(self, file_path: str, **info):
+        self.entries[self.key(file_path)] = info
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+class _FileStream:
+    """
+    Bounded hand-off of one file's chunk batches from its extraction worker to
+    the consumer. Messages: ("known", hash), ("start", hash, pages),
+    ("batch", chunks), ("end",) and ("error", exception).
+    """
+
+    def __init__(self, maxsize: int):
+        self._q = queue.Queue(maxsize=maxsize)
+        self.cancelled = threading.Event()
+
+    def put(self, *msg) -> bool:
+        # blocks while the consumer is behind; False once the consumer gave up on the file
+        while not self.cancelled.is_set():
+            try:
+                self._q.put(msg, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self):
+        return self._q.get()
+
+    def batches(self):
+        while True:
+            msg = self.get()
+            if msg[0] == "end":
+                return
+            if msg[0] == "error":
+                raise msg[1]
+            yield msg[1]
+
+
+class BulkIngestor:
+    """
+    Stage 1 (thread pool): extraction / OCR, cleaning and chunking per file.
+    Stage 2 (calling thread): batched embedding, indexing and a save per file.
+    Each file's chunk batches stream through a queue of `file_batches`, so a
+    file being extracted never holds more than that many batches in memory;
+    at most `queue_size` files are handed ahead of the consumer.
+    """
+
+    def __init__(
+        self,
+        doc_manager,
+        vector_store,
+        checkpoint_path: str = config.BULK_CHECKPOINT_PATH,
+        extract_workers: int = config.BULK_EXTRACT_WORKERS,
+        queue_size: int = config.BULK_QUEUE_SIZE,
+        file_batches: int = config.BULK_FILE_BATCHES
+    ):
+        self.dm = doc_manager
+        self.vs = vector_store
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.extract_workers = max(1, extract_workers)
+        self.queue_size = max(1, queue_size)
+        self.file_batches = max(1, file_batches)
+
+    def _extract(self, path, stream: _FileStream):
+        try:
+            content_hash = file_hash(path)
+            if self.dm.db.find_by_hash(content_hash) is not None:
+                # same content already in the library: skip extraction and OCR
+                stream.put("known", content_hash)
+                return
+            if not stream.put("start", content_hash, self.dm.page_count(path)):
+                return
+            for batch in self.dm.iter_chunk_batches(path):
+                if not stream.put("batch", batch):
+                    return
+            stream.put("end")
+        except Exception as e:
+            stream.put("error", e)
+
+    def _produce(self, paths, out: queue.Queue):
+        # files are extracted in submission order and consumed in the same order,
+        # so the file the consumer waits on always has (or gets) a worker
+        with ThreadPoolExecutor(max_workers=self.extract_workers) as pool:
+            for path in paths:
+                stream = _FileStream(self.file_batches)
+                pool.submit(self._extract, path, stream)
+                out.put((path, stream))
+        out.put(_DONE)
+
+    def _consume(self, path, stream: _FileStream):
+        """(doc_id, chunks stored, pages, duplicate) for one file."""
+        msg = stream.get()
+        if msg[0] == "error":
+            raise msg[1]
+        content_hash = msg[1]
+        # checked again here: an identical file may have been indexed since
+        # extraction started, or the known copy deleted since it was skipped
+        existing = self.dm.find_duplicate(path, content_hash)
+        if existing is not None:
+            self.dm.link_duplicate(existing, path)
+            return existing["doc_id"], 0, 0, True
+        doc_id = str(uuid.uuid4())
+        if msg[0] == "known":
+            stored = self.dm.ingest_stream(path, doc_id, content_hash=content_hash)
+            return doc_id, stored, self.dm.page_count(path), False
+        page_count = msg[2]
+        stored = self.dm.index_document(path, doc_id, stream.batches(), page_count, content_hash)
+        return doc_id, stored, page_count, False
+
+    def run(self, target: str, on_file=None) -> dict:
+        paths = expand_inputs(target)
+        todo = [p for p in paths if not self.checkpoint.is_done(p)]
+        stats = {"found": len(paths), "skipped": len(paths) - len(todo), "ingested": 0, "duplicates": 0,
+                 "failed": 0, "chunks": 0, "pages": 0}
+
+        started = time.perf_counter()
+        handoff = queue.Queue(maxsize=self.queue_size)
+        producer = threading.Thread(target=self._produce, args=(todo, handoff), daemon=True)
+        producer.start()
+
+        while True:
+            item = handoff.get()
+            if item is _DONE:
+                break
+            path, stream = item
+            try:
+                doc_id, stored, page_count, duplicate = self._consume(path, stream)
+                self.checkpoint.mark(path, status="done", doc_id=doc_id, chunks=stored)
+                if duplicate:
+                    stats["duplicates"] += 1
+                    status = f"duplicate of {doc_id}"
+                else:
+                    stats["ingested"] += 1
+                    stats["chunks"] += stored
+                    stats["pages"] += page_count
+                    status = "done"
+            except Exception as e:
+                self.checkpoint.mark(path, status="failed", error=repr(e))
+                stats["failed"] += 1
+                status = f"failed: {e!r}"
+            finally:
+                # a duplicate or a failure leaves the worker feeding this file: release it
+                stream.cancelled.set()
+            if on_file is not None:
+                on_file(path, status)
+
+        producer.join()
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = elapsed
+        stats["files_per_sec"] = stats["ingested"] / elapsed if elapsed else 0.0
+        stats["chunks_per_sec"] = stats["chunks"] / elapsed if elapsed else 0.0
+        return stats
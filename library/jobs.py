@@ -0,0 +1,110 @@
+# library/jobs.py
+# Background ingestion: files are queued and indexed by worker threads while
+# searches keep running against the same VectorStore.
+
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from utils.tracing import tracer
+import config
+
+_STOP = object()
+
+
+class IngestQueue:
+    """
+    submit(path) returns a job id at once; status(job_id) reports
+    queued -> running -> done / duplicate / failed, with page progress.
+    Files whose content is already in the library finish as "duplicate";
+    each submit is its own job, so callers must not reuse a path that a
+    queued or running job still reads.
+    """
+
+    def __init__(self, doc_manager, workers: int = config.INGEST_QUEUE_WORKERS,
+                 history: int = config.INGEST_JOB_HISTORY):
+        self.dm = doc_manager
+        self.history = history
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, path: str) -> str:
+        path = os.path.abspath(path)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "path": path,
+                "name": os.path.basename(path),
+                "state": "queued",
+                "submitted": time.time(),
+                "pages_done": 0,
+                "pages": None,
+            }
+        self._queue.put(job_id)
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        """A copy of the job record, or None for an unknown (or expired) job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def jobs(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(job["state"] in ("queued", "running") for job in self._jobs.values())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _finish(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, finished=time.time())
+            # forget the oldest finished jobs beyond the history limit
+            finished = [jid for jid, j in self._jobs.items() if "finished" in j]
+            for jid in finished[:max(0, len(finished) - self.history)]:
+                del self._jobs[jid]
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is _STOP:
+                return
+            path = self._jobs[job_id]["path"]
+            self._update(job_id, state="running", started=time.time())
+            try:
+                with tracer.span("ingest.job", file=os.path.basename(path)):
+                    doc_id, stored, duplicate = self.dm.add_file(
+                        path,
+                        on_page=lambda n, total: self._update(job_id, pages_done=n, pages=total)
+                    )
+                self._finish(job_id, state="duplicate" if duplicate else "done", doc_id=doc_id, chunks=stored)
+            except Exception as e:
+                print(f"[IngestQueue] {os.path.basename(path)} failed: {e!r}")
+                self._finish(job_id, state="failed", error=repr(e))
+            if tracer.enabled:
+                # long-running hosts (the Streamlit app) never reach an atexit hook
+                tracer.write_metrics()
+
+    def close(self, wait: bool = True):
+        """Stop the workers after the jobs already queued."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        if wait:
+            for t in self._threads:
+                t.join()
@@ -1,53 +1,274 @@
 # library/manager.py
+import hashlib
 import os
+import threading
 import time
+import uuid
 from pathlib import Path  
-from preprocess.pdf_reader import PDFReader
-from preprocess.ocr import OCRExtractor
 from preprocess.cleaner import TextCleaner
 from embed.chunker import TextChunker
 from library.metadata import MetadataDB
+from utils.tracing import tracer
 import config
 
+
+def file_hash(path, block_size=1 << 20):
+    """sha256 of the file's bytes, read in blocks; names and timestamps play no part."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
 class DocumentManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path=config.LIBRARY_DB_PATH, vector_store=None):
         self.db = MetadataDB(db_path)
+        # needed for delete/replace, which must keep the index in sync
+        self.vs = vector_store
 
-        self.pdf_reader = PDFReader()
-        self.ocr = OCRExtractor()
+        # extraction components are built on first ingest; list/delete never need them
+        self._pdf_reader = None
+        self._ocr = None
+        # BulkIngestor extracts on several threads: build each component once
+        self._components_lock = threading.Lock()
         self.cleaner = TextCleaner()
         self.chunker = TextChunker(
             chunk_size=config.CHUNK_SIZE,
             overlap=config.CHUNK_OVERLAP
         )
 
-    def ingest_document(self, path, doc_id):
-        file_name = os.path.basename(path)
+    @property
+    def pdf_reader(self):
+        if self._pdf_reader is None:
+            with self._components_lock:
+                if self._pdf_reader is None:
+                    from preprocess.pdf_reader import PDFReader
+                    self._pdf_reader = PDFReader()
+        return self._pdf_reader
 
+    @property
+    def ocr(self):
+        if self._ocr is None:
+            with self._components_lock:
+                if self._ocr is None:
+                    from preprocess.ocr import OCRExtractor
+                    self._ocr = OCRExtractor()
+        return self._ocr
+
+    def _iter_pages(self, path):
         if path.lower().endswith(".pdf"):
-            # let PDFReader decide native text vs scanned (it will use ocr_extractor)
-            text, page_count = self.pdf_reader.extract_text(path, return_pages=True, ocr_extractor=self.ocr)
+            # PDFReader decides native text vs OCR page by page
+            yield from self.pdf_reader.iter_pages(path, ocr_extractor=self.ocr)
         else:
             # images -> OCR directly
-            text = self.ocr.extract(Path(path))
-            page_count = 1
+            yield 1, self.ocr.extract(Path(path))
+
+    def page_count(self, path):
+        if path.lower().endswith(".pdf"):
+            return self.pdf_reader.page_count(path)
+        return 1
 
-        cleaned_text = self.cleaner.clean_text(text)
-        chunks = self.chunker.split(cleaned_text)
+    def iter_chunk_batches(self, path, batch_size=config.INGEST_EMBED_BATCH, on_page=None):
+        """
+        Stream batches of Chunk records (text, page, start, end): pages are
+        cleaned and chunked one at a time, so only the current window is held
+        in memory. Offsets are relative to the cleaned page text.
+        """
+        chunks = []
+        pages = self._iter_pages(path)
+        while True:
+            # extraction (and OCR, when a window needs it) happens inside next()
+            with tracer.span("ingest.extract"):
+                item = next(pages, None)
+            if item is None:
+                break
+            page_no, text = item
+            tracer.count("pages")
+            with tracer.span("ingest.clean"):
+                text = self.cleaner.clean_text(text)
+            with tracer.span("ingest.chunk"):
+                page_chunks = self.chunker.chunk_page(text, page_no)
+            tracer.count("chunks", len(page_chunks))
+            for chunk in page_chunks:
+                chunks.append(chunk)
+                if len(chunks) >= batch_size:
+                    yield chunks
+                    chunks = []
+            if on_page is not None:
+                on_page(page_no)
+        if chunks:
+            yield chunks
 
+    def record_document(self, path, doc_id, page_count, chunk_count, content_hash=None):
         self.db.add_document({
             "doc_id": doc_id,
-            "name": file_name,
+            "name": os.path.basename(path),
             "path": path,
             "timestamp": time.time(),
             "pages": page_count,
-            "chunks": len(chunks)
+            "chunks": chunk_count,
+            "sha256": content_hash or file_hash(path),
+            "size": os.path.getsize(path)
         })
 
-        return chunks
+    def find_duplicate(self, path, content_hash=None):
+        """Library record of a document with the same content as `path`, or None."""
+        content_hash = content_hash or file_hash(path)
+        found = self.db.find_by_hash(content_hash)
+        if found is None:
+            found = self._match_unhashed(path, content_hash)
+        return found
+
+    def _match_unhashed(self, path, content_hash):
+        # records from before content hashes were kept: only same-size files can
+        # match, and each is hashed once and the hash stored
+        size = os.path.getsize(path)
+        for d in self.db.find_unhashed(size):
+            if not os.path.isfile(d.get("path", "")) or os.path.getsize(d["path"]) != size:
+                continue
+            d["sha256"], d["size"] = file_hash(d["path"]), size
+            self.db.update_document(d["doc_id"], sha256=d["sha256"], size=size)
+            if d["sha256"] == content_hash:
+                return d
+        return None
+
+    def link_duplicate(self, record, path):
+        """Remember `path` as another copy of an already ingested document."""
+        aliases = record.get("aliases", [])
+        if path != record.get("path") and path not in aliases:
+            self.db.update_document(record["doc_id"], aliases=aliases + [path])
+
+    def add_file(self, path, on_page=None):
+        """
+        Ingest `path` unless a file with the same content is already in the
+        library, in which case it is linked to that document instead.
+        Returns (doc_id, chunks stored, duplicate).
+        """
+        content_hash = file_hash(path)
+        existing = self.find_duplicate(path, content_hash)
+        if existing is not None:
+            self.link_duplicate(existing, path)
+            return existing["doc_id"], 0, True
+        doc_id = str(uuid.uuid4())
+        stored = self.ingest_stream(path, doc_id, on_page=on_page, content_hash=content_hash)
+        return doc_id, stored, False
+
+    def ingest_stream(self, path, doc_id, on_page=None, content_hash=None):
+        """
+        Extract, clean, chunk, embed and index `path` page by page.
+        `on_page(page_no, page_count)` is called after each page.
+        Returns the number of chunks stored. The index is saved inside the
+        transaction that writes the library record, so a failed save leaves
+        no record behind.
+        """
+        self._require_vector_store()
+        with tracer.span("ingest.document", doc_id=doc_id, file=os.path.basename(path)) as span:
+            page_count = self.page_count(path)
+            progress = (lambda n: on_page(n, page_count)) if on_page else None
+            stored = self.index_document(
+                path, doc_id, self.iter_chunk_batches(path, on_page=progress), page_count, content_hash
+            )
+            span.set(pages=page_count, chunks=stored)
+        return stored
+
+    def index_document(self, path, doc_id, batches, page_count, content_hash=None):
+        """
+        Add chunk batches for `doc_id`, then write its library record and save
+        the index in one transaction. Batches become searchable as they are
+        added, so on any failure the rows added so far are deleted again
+        before the error propagates: no chunk outlives a missing record.
+        """
+        try:
+            stored = self.vs.add_batches(batches, doc_id, os.path.basename(path), page_count)
+            with self.db.transaction():
+                self.record_document(path, doc_id, page_count, stored, content_hash)
+                self.vs.save()
+        except Exception:
+            self._discard_chunks(doc_id)
+            raise
+        return stored
+
+    def _discard_chunks(self, doc_id):
+        self.vs.delete_document(doc_id)
+        try:
+            # a concurrent save may already have persisted some of the rows
+            self.vs.save()
+        except Exception as e:
+            print(f"[DocumentManager] Could not save the rollback of {doc_id}: {e!r}")
+
+    def _require_vector_store(self):
+        if self.vs is None:
+            raise ValueError("[DocumentManager] A vector store is required to delete or replace documents.")
+
+    def delete_document(self, doc_id):
+        """
+        Remove a document from the index, chunk store and library metadata.
+        Returns the number of chunks removed.
+        """
+        self._require_vector_store()
+        if self.db.get(doc_id) is None:
+            raise KeyError(f"[DocumentManager] Unknown document: {doc_id}")
+        with self.db.transaction():
+            self.db.remove_document(doc_id)
+            removed = self.vs.delete_document(doc_id)
+            self.vs.save()
+        return removed
+
+    def replace_document(self, doc_id, path):
+        """
+        Re-ingest `path` under an existing doc_id. The new content is extracted
+        and embedded first; only the swap of old chunks and record for new ones
+        runs in a transaction. Returns the number of new chunks.
+        """
+        self._require_vector_store()
+        if self.db.get(doc_id) is None:
+            raise KeyError(f"[DocumentManager] Unknown document: {doc_id}")
+        content_hash = file_hash(path)
+        existing = self.find_duplicate(path, content_hash)
+        if existing is not None and existing["doc_id"] != doc_id:
+            raise ValueError(f"[DocumentManager] {os.path.basename(path)} is already in the library as {existing['doc_id']}")
+
+        with tracer.span("ingest.replace", doc_id=doc_id, file=os.path.basename(path)) as span:
+            # extraction, OCR and embedding hold no lock and no transaction
+            page_count = self.page_count(path)
+            staged = [(batch, self.vs.embed([c.text for c in batch])) for batch in self.iter_chunk_batches(path)]
+            old_chunks = [self.vs.get_chunk(int(r)) for r in self.vs.chunks.rows_for_doc(doc_id)]
+
+            # if the swap fails, the old record comes back with the rollback
+            # and the old chunks are indexed again
+            with self.db.transaction():
+                self.db.remove_document(doc_id)
+                self.vs.delete_document(doc_id)
+                try:
+                    stored = self.vs.add_batches(staged, doc_id, os.path.basename(path), page_count)
+                    self.record_document(path, doc_id, page_count, stored, content_hash)
+                    self.vs.save()
+                except Exception:
+                    self.vs.delete_document(doc_id)
+                    self._restore_chunks(doc_id, old_chunks)
+                    raise
+            span.set(pages=page_count, chunks=stored)
+        return stored
+
+    def _restore_chunks(self, doc_id, old_chunks):
+        # re-embedding the old texts is mostly embedding-cache hits, and works
+        # for every index engine (PQ codes cannot be decoded back)
+        if old_chunks:
+            first = old_chunks[0]
+            self.vs.add_with_return(
+                [c["text"] for c in old_chunks], doc_id, first["filename"], first["pages"],
+                page_numbers=[c["page"] for c in old_chunks],
+                spans=[(c["start"], c["end"]) for c in old_chunks]
+            )
+        self.vs.save()
+
+    def count_documents(self):
+        return self.db.count()
 
-    def list_documents(self):
-        docs = self.db.get_all()
+    def list_documents(self, offset=0, limit=None):
+        """Library records in ingestion order; pass `limit` to page through them."""
+        docs = self.db.get_all() if limit is None else self.db.list_page(offset, limit)
         for d in docs:
             d.setdefault("pages", "unknown")
             d.setdefault("chunks", 0)
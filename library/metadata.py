@@ -1,24 +1,169 @@
 # library/metadata.py
+# Library records (one per ingested document) in SQLite, indexed by doc_id,
+# file name and content hash.
+
 import json
 import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import config
+
+# first-class columns; any other field of a record is kept in the `extra` JSON
+_COLUMNS = ("doc_id", "name", "path", "sha256", "size", "pages", "chunks", "timestamp")
 
 
 class MetadataDB:
-    def __init__(self, path):
+    def __init__(self, path: str = config.LIBRARY_DB_PATH, json_path: str = None):
+        if path.endswith(".json"):
+            # callers that still pass the old JSON path get the database beside it
+            json_path, path = path, os.path.splitext(path)[0] + ".sqlite"
+        elif json_path is None and os.path.abspath(path) == os.path.abspath(config.LIBRARY_DB_PATH):
+            json_path = config.LIBRARY_META_PATH
         self.path = path
-        if os.path.exists(path):
-            self.db = json.load(open(path))
-        else:
-            self.db = []
-            self._save()
+        self.json_path = json_path  # legacy JSON library, imported once
+        self._lock = threading.RLock()
+        self._depth = 0
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY, name TEXT, path TEXT, sha256 TEXT,
+                size INTEGER, pages INTEGER, chunks INTEGER, timestamp REAL,
+                extra TEXT NOT NULL DEFAULT '{}');
+            CREATE INDEX IF NOT EXISTS documents_name ON documents(name);
+            CREATE INDEX IF NOT EXISTS documents_sha256 ON documents(sha256);
+            CREATE INDEX IF NOT EXISTS documents_timestamp ON documents(timestamp);
+            """
+        )
 
-    def _save(self):
-        with open(self.path, "w") as f:
-            json.dump(self.db, f, indent=2)
+        if json_path and os.path.exists(json_path) and self.count() == 0:
+            n = self._import_json(json_path)
+            os.replace(json_path, json_path + ".migrated")
+            print(f"[MetadataDB] Imported {n} documents from legacy {os.path.basename(json_path)}.")
+
+    def _import_json(self, json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        with self.transaction():
+            for d in docs:
+                if d.get("doc_id"):
+                    self.add_document(d)
+        return len(docs)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes into one atomic commit. Nested uses join the outer
+        transaction; an exception anywhere inside rolls all of it back, so
+        callers can commit library records only once the index is saved.
+        """
+        with self._lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute("COMMIT")
+
+    @staticmethod
+    def _row_to_doc(row):
+        if row is None:
+            return None
+        doc = json.loads(row["extra"])
+        for col in _COLUMNS:
+            if row[col] is not None:
+                doc[col] = row[col]
+        return doc
 
     def add_document(self, meta):
-        self.db.append(meta)
-        self._save()
+        extra = {k: v for k, v in meta.items() if k not in _COLUMNS}
+        values = [meta.get(col) for col in _COLUMNS] + [json.dumps(extra)]
+        # ints only: legacy records may say "pages": "unknown"
+        for i, col in enumerate(_COLUMNS):
+            if col in ("size", "pages", "chunks") and not isinstance(values[i], int):
+                values[i] = None
+        with self.transaction():
+            # upsert keeps the rowid, and with it the record's place in listings
+            self.conn.execute(
+                f"INSERT INTO documents ({', '.join(_COLUMNS)}, extra) "
+                f"VALUES ({', '.join('?' * (len(_COLUMNS) + 1))}) "
+                f"ON CONFLICT(doc_id) DO UPDATE SET "
+                f"{', '.join(f'{c} = excluded.{c}' for c in _COLUMNS[1:] + ('extra',))}",
+                values
+            )
+
+    def get(self, doc_id):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return self._row_to_doc(row)
+
+    def find_by_hash(self, content_hash):
+        """Record of the document with this content hash, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM documents WHERE sha256 = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+        return self._row_to_doc(row)
+
+    def find_by_name(self, name):
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM documents WHERE name = ? ORDER BY rowid", (name,)).fetchall()
+        return [self._row_to_doc(r) for r in rows]
+
+    def find_unhashed(self, size=None):
+        """Records written before content hashes were kept (optionally: of this file size)."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM documents WHERE sha256 IS NULL AND (? IS NULL OR size IS NULL OR size = ?) "
+                "ORDER BY rowid",
+                (size, size)
+            ).fetchall()
+        return [self._row_to_doc(r) for r in rows]
+
+    def update_document(self, doc_id, **fields):
+        with self.transaction():
+            doc = self.get(doc_id)
+            if doc is None:
+                return False
+            doc.update(fields)
+            self.add_document(doc)
+        return True
+
+    def remove_document(self, doc_id):
+        with self.transaction():
+            cur = self.conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        return cur.rowcount > 0
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def list_page(self, offset=0, limit=50):
+        """Records in ingestion order, `limit` at a time."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM documents ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [self._row_to_doc(r) for r in rows]
 
     def get_all(self):
-        return self.db
+        return self.list_page(0, -1)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
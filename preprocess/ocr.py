@@ -1,22 +1,78 @@
 # preprocess/ocr.py
 from pathlib import Path
-import tempfile
-from pdf2image import convert_from_path
-from paddleocr import PaddleOCR
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importlib import metadata
 from PIL import Image
-import os
+import numpy as np
+from preprocess.ocr_cache import OCRCache
+from utils.tracing import tracer
+import config
+
+
+# per-process OCR engine used by pool workers
+_worker_ocr = None
+
+
+def _init_worker():
+    global _worker_ocr
+    # the parent process owns the cache; workers only run OCR
+    _worker_ocr = OCRExtractor(workers=1, cache_path=None)
+
+
+def _ocr_batch_worker(batch):
+    # batch: [(page_index, RGB array)] -> [(page_index, text, error)]
+    out = []
+    for idx, img in batch:
+        try:
+            out.append((idx, _worker_ocr.extract_from_image(img), None))
+        except Exception as e:
+            out.append((idx, "", repr(e)))
+    return out
+
 
 class OCRExtractor:
-    def __init__(self):
-        # Initialize PaddleOCR in the most compatible way for multiple versions
-        print("[PaddleOCR] Initializing (compat mode)...")
+    def __init__(
+        self,
+        workers: int = config.OCR_WORKERS,
+        batch_size: int = config.OCR_BATCH_SIZE,
+        cache_path: str = config.OCR_CACHE_PATH,
+        cache_max_bytes: int = config.OCR_CACHE_MAX_BYTES
+    ):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.lang = config.OCR_LANGS[0] if config.OCR_LANGS else "en"
+        self._reader = None
+        self._pool = None
+        # bulk ingest shares one extractor across extraction threads: PaddleOCR
+        # is not thread-safe, so in-process OCR is serialized, and the pool is
+        # created and torn down under its own lock
+        self._ocr_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        # read without importing paddleocr, which is slow and only needed to OCR
         try:
-            # minimal args
-            self.reader = PaddleOCR(lang="en")
-        except TypeError:
-            # more fallback
-            self.reader = PaddleOCR()
-        print("[PaddleOCR] Loaded (legacy-compatible mode).")
+            version = metadata.version("paddleocr")
+        except metadata.PackageNotFoundError:
+            version = "unknown"
+        self.cache = OCRCache(cache_path, cache_max_bytes, self.lang, version) if cache_path else None
+
+    @property
+    def reader(self):
+        # PaddleOCR is loaded on first use; pool workers load their own copy
+        if self._reader is None:
+            from paddleocr import PaddleOCR
+            # Initialize PaddleOCR in the most compatible way for multiple versions
+            print("[PaddleOCR] Initializing (compat mode)...")
+            try:
+                # minimal args
+                self._reader = PaddleOCR(lang=self.lang)
+            except TypeError:
+                # more fallback
+                self._reader = PaddleOCR()
+            print("[PaddleOCR] Loaded (legacy-compatible mode).")
+        return self._reader
 
     def _clean_lines_from_result(self, result):
         lines = []
@@ -45,84 +101,156 @@ class OCRExtractor:
                     continue
         return lines
 
-    def extract_from_image(self, image_path: str) -> str:
-        # Ensure Pillow can open large images without crazy memory blowups
-        img = Image.open(image_path)
-        w, h = img.size
+    def _to_array(self, image) -> np.ndarray:
+        # path, PIL image or HxWxC uint8 RGB array -> RGB array, all in memory
+        if isinstance(image, np.ndarray):
+            arr = image
+        else:
+            if not isinstance(image, Image.Image):
+                image = Image.open(image)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            arr = np.asarray(image)
+        if arr.ndim == 2:
+            arr = np.stack([arr] * 3, axis=-1)
+        elif arr.shape[2] == 4:
+            arr = arr[:, :, :3]
+
+        # keep PaddleOCR memory in check on very large pages
+        h, w = arr.shape[:2]
         max_side = 4000
         if max(w, h) > max_side:
             ratio = max_side / max(w, h)
             new_size = (int(w * ratio), int(h * ratio))
-            img = img.resize(new_size, Image.LANCZOS)
-            tmp_path = image_path + ".resized.png"
-            img.save(tmp_path, format="PNG")
-            image_to_process = tmp_path
-        else:
-            image_to_process = image_path
+            arr = np.asarray(Image.fromarray(arr).resize(new_size, Image.LANCZOS))
+        return arr
 
-        result = self.reader.ocr(image_to_process)
-        if image_to_process.endswith(".resized.png"):
-            try:
-                os.remove(image_to_process)
-            except:
-                pass
-
-        lines = self._clean_lines_from_result(result)
+    def extract_from_image(self, image) -> str:
+        """
+        OCR a single image given as a file path, PIL image or RGB numpy array.
+        No intermediate files are written.
+        """
+        arr = self._to_array(image)
+        # PaddleOCR expects BGR like cv2.imread
+        with self._ocr_lock:
+            result = self.reader.ocr(np.ascontiguousarray(arr[:, :, ::-1]))
+        lines = self._clean_lines_from_result(result or [])
         return "\n".join(lines).strip()
 
-    def extract_from_scanned_pdf(self, pdf_path: str) -> str:
-        pages = convert_from_path(pdf_path, dpi=200)
-        out_pages = []
-        for i, page in enumerate(pages, start=1):
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                page.save(tmp.name, "PNG")
-                text = self.extract_from_image(tmp.name)
-                out_pages.append(f"### PAGE {i} ###\n{text}")
-                try:
-                    os.remove(tmp.name)
-                except:
-                    pass
-        return "\n\n".join(out_pages).strip()
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: PaddleOCR / its thread pools are not fork-safe
+                ctx = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_init_worker)
+            return self._pool
 
-    def is_scanned_pdf(self, pdf_path: Path) -> bool:
-        # conservative: prefer PyPDF2 for text detection
-        try:
-            from PyPDF2 import PdfReader
-        except Exception:
-            # if PyPDF2 missing, fallback to pdfplumber if available
+    def _drop_pool(self, pool):
+        # only the thread that first sees `pool` broken replaces it
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def _extract_pages_serial(self, pages, texts, labels, failed):
+        for idx, img in pages:
             try:
-                import pdfplumber
-            except Exception:
-                return True
+                texts[idx] = self.extract_from_image(img)
+            except Exception as e:
+                print(f"[OCR] Page {labels[idx]} failed: {e!r}")
+                texts[idx] = ""
+                failed.add(idx)
+
+    def extract_pages(self, images, page_numbers=None, dpi=None) -> list:
+        """
+        OCR a list of page images (RGB arrays or PIL images), returning their
+        text in page order. Pages already in the OCR cache (same pixels, DPI,
+        language and OCR version) are not OCR'd again.
+        With workers > 1, batches of OCR_BATCH_SIZE pages are spread over a
+        process pool. A page that fails yields "" instead of failing the document.
+        """
+        with tracer.span("ocr.pages", pages=len(images), workers=self.workers):
+            return self._extract_pages(images, page_numbers, dpi)
+
+    def _extract_pages(self, images, page_numbers, dpi):
+        images = [self._to_array(img) for img in images]
+        texts = [""] * len(images)
+        # 1-based page numbers, used only for log messages
+        labels = list(page_numbers) if page_numbers is not None else list(range(1, len(images) + 1))
+
+        keys = None
+        pages = list(enumerate(images))
+        if self.cache is not None and images:
+            keys = [self.cache.key(img, dpi) for img in images]
+            cached = self.cache.lookup(keys)
+            pages = []
+            for idx, (key, img) in enumerate(zip(keys, images)):
+                if key in cached:
+                    texts[idx] = cached[key]
+                else:
+                    pages.append((idx, img))
 
+        tracer.count("ocr_cache_hits", len(images) - len(pages))
+        tracer.count("ocr_pages", len(pages))
+        failed = set()
+        self._run_pages(pages, texts, labels, failed)
+
+        if keys is not None and pages:
+            done = [idx for idx, _ in pages if idx not in failed]
+            self.cache.insert([keys[i] for i in done], [texts[i] for i in done])
+        return texts
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+
+    def _run_pages(self, pages, texts, labels, failed):
+        if not pages:
+            return
+        if self.workers <= 1 or len(pages) <= 1:
+            self._extract_pages_serial(pages, texts, labels, failed)
+            return
+
+        batches = [pages[i:i + self.batch_size] for i in range(0, len(pages), self.batch_size)]
+        pool = self._get_pool()
+        futures = [(batch, pool.submit(_ocr_batch_worker, batch)) for batch in batches]
+        leftover = []
+        for batch, fut in futures:
             try:
-                with pdfplumber.open(pdf_path) as pdf:
-                    for p in pdf.pages:
-                        t = p.extract_text()
-                        if t and t.strip():
-                            return False
-            except:
-                return True
-            return True
+                for idx, text, error in fut.result():
+                    if error:
+                        print(f"[OCR] Page {labels[idx]} failed: {error}")
+                        failed.add(idx)
+                    texts[idx] = text
+            except BrokenProcessPool:
+                # a worker died (e.g. OOM); finish the affected pages in-process
+                leftover.extend(batch)
+            except Exception as e:
+                print(f"[OCR] Batch starting at page {labels[batch[0][0]]} failed: {e!r}")
+                failed.update(idx for idx, _ in batch)
+        if leftover:
+            print(f"[OCR] Worker pool broke; OCR-ing {len(leftover)} page(s) in-process.")
+            self._drop_pool(pool)
+            self._extract_pages_serial(leftover, texts, labels, failed)
 
-        try:
-            reader = PdfReader(str(pdf_path))
-            for p in reader.pages:
-                txt = p.extract_text()
-                if txt and txt.strip():
-                    return False
-        except:
-            return True
-        return True
+    def extract_from_scanned_pdf(self, pdf_path: str) -> str:
+        # render pages straight from the PDF into arrays, one window at a time
+        from preprocess.pdf_reader import PDFReader
+        reader = PDFReader(dpi=200, mode="image-only")
+        out_pages = [f"### PAGE {i} ###\n{text}" for i, text in reader.iter_pages(pdf_path, ocr_extractor=self)]
+        return "\n\n".join(out_pages).strip()
 
     def extract(self, file_path: Path) -> str:
         ext = file_path.suffix.lower()
         if ext in [".png", ".jpg", ".jpeg"]:
-            return self.extract_from_image(str(file_path))
+            # through extract_pages so repeated images hit the OCR cache
+            return self.extract_pages([str(file_path)])[0]
         if ext == ".pdf":
-            # This extractor only performs OCR; prefer PDFReader for native text.
-            if self.is_scanned_pdf(file_path):
-                return self.extract_from_scanned_pdf(str(file_path))
-            else:
-                return ""  # signal: not scanned (PDFReader should be used)
+            # This extractor only performs OCR; PDFReader decides per page which pages need it.
+            return self.extract_from_scanned_pdf(str(file_path))
         return f"[OCR ERROR] Unsupported file type: {ext}"
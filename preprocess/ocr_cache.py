@@ -0,0 +1,33 @@
+# preprocess/ocr_cache.py
+import hashlib
+
+import numpy as np
+
+from utils.disk_cache import DiskLRUCache
+
+
+class OCRCache:
+    """
+    On-disk OCR results keyed by (rendered page content, DPI, OCR language, OCR version).
+    """
+
+    def __init__(self, path: str, max_bytes: int, lang: str, version: str):
+        self.lang = lang
+        self.version = version
+        self.store = DiskLRUCache(path, max_bytes)
+
+    def key(self, image: np.ndarray, dpi) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{image.shape}|{image.dtype}|{dpi}|{self.lang}|{self.version}".encode("utf-8"))
+        h.update(np.ascontiguousarray(image).data)
+        return h.hexdigest()
+
+    def lookup(self, keys):
+        """Return {key: text} for cached keys."""
+        return {k: v.decode("utf-8") for k, v in self.store.get_many(keys).items()}
+
+    def insert(self, keys, texts):
+        self.store.put_many((k, t.encode("utf-8")) for k, t in zip(keys, texts))
+
+    def stats(self) -> dict:
+        return self.store.stats()
@@ -1,41 +1,99 @@
 # preprocess/pdf_reader.py
 import fitz  
-from typing import List, Tuple
+from itertools import islice
+from typing import Iterable, Iterator, Tuple
 from PIL import Image
-import io
+import numpy as np
+import config
 
 class PDFReader:
-    def __init__(self, dpi: int = 200):
+    def __init__(
+        self,
+        dpi: int = 200,
+        mode: str = config.PDF_TEXT_MODE,
+        min_page_chars: int = config.PDF_MIN_PAGE_CHARS
+    ):
+        if mode not in ("auto", "text-only", "image-only"):
+            raise ValueError(f"[PDFReader] Unknown PDF text mode: {mode}")
         self.dpi = dpi
+        self.mode = mode
+        self.min_page_chars = min_page_chars
 
-    def extract_images(self, pdf_path: str) -> List[Image.Image]:
-        doc = fitz.open(pdf_path)
-        images = []
+    def render_page(self, page) -> np.ndarray:
+        """
+        Rasterize a page to an HxWx3 uint8 RGB array built directly from the
+        pixmap sample buffer (no PNG encode/decode).
+        """
         zoom = self.dpi / 72
-        mat = fitz.Matrix(zoom, zoom)
-        for page in doc:
-            pix = page.get_pixmap(matrix=mat)
-            img = Image.open(io.BytesIO(pix.tobytes("png")))
-            images.append(img)
-        return images
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+        arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+        return arr[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+    def iter_images(self, pdf_path: str) -> Iterator[Image.Image]:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                yield Image.fromarray(self.render_page(page))
+
+    def extract_images(self, pdf_path: str) -> Iterator[Image.Image]:
+        # lazy: one rendered page at a time, never the whole document
+        return self.iter_images(pdf_path)
+
+    def page_count(self, pdf_path: str) -> int:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+
+    def extract_text_from_images(self, images: Iterable[Image.Image], ocr_extractor,
+                                 window: int = config.INGEST_WINDOW_PAGES) -> str:
+        # OCR'd `window` pages at a time (page-parallel when the extractor has a
+        # worker pool), so a lazy image iterator is never materialized whole
+        images = iter(images)
+        parts, page = [], 1
+        while True:
+            batch = list(islice(images, max(1, window)))
+            if not batch:
+                break
+            texts = ocr_extractor.extract_pages(batch, page_numbers=range(page, page + len(batch)), dpi=self.dpi)
+            for t in texts:
+                parts.append(f"### PAGE {page} ###\n{t}")
+                page += 1
+        return "\n\n".join(parts)
 
-    def extract_text_from_images(self, images: List[Image.Image], ocr_extractor) -> str:
-        text_list = []
-        for idx, img in enumerate(images, start=1):
-            tmp = io.BytesIO()
-            img.save(tmp, format="PNG")
-            tmp.seek(0)
-            # pass bytes path to OCR extractor which expects a path
-            with open(f"/tmp/docinferx_page_{idx}.png", "wb") as f:
-                f.write(tmp.read())
-            page_text = ocr_extractor.extract_from_image(f"/tmp/docinferx_page_{idx}.png")
-            text_list.append(f"### PAGE {idx} ###\n{page_text}")
-            try:
-                import os
-                os.remove(f"/tmp/docinferx_page_{idx}.png")
-            except:
-                pass
-        return "\n\n".join(text_list)
+    def _needs_ocr(self, text: str) -> bool:
+        if self.mode == "image-only":
+            return True
+        if self.mode == "text-only":
+            return False
+        return len(text.strip()) < self.min_page_chars
+
+    def iter_pages(self, pdf_path: str, ocr_extractor=None, window: int = config.INGEST_WINDOW_PAGES) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (page_number, text) in page order. Pages with a usable text layer
+        keep get_text(); empty or near-empty pages are rasterized and OCR'd.
+        At most `window` pages (and their rendered images) are in flight at once.
+        """
+        window = max(1, window)
+        with fitz.open(pdf_path) as doc:
+            for start in range(0, doc.page_count, window):
+                numbers = range(start, min(start + window, doc.page_count))
+                page_texts = {i: (doc[i].get_text("text") or "").strip() for i in numbers}
+                ocr_pages = [i for i in numbers if self._needs_ocr(page_texts[i])]
+
+                if ocr_pages and ocr_extractor is not None:
+                    images = [self.render_page(doc[i]) for i in ocr_pages]
+                    ocr_texts = ocr_extractor.extract_pages(
+                        images, page_numbers=[i + 1 for i in ocr_pages], dpi=self.dpi
+                    )
+                    del images
+                    for i, ocr_text in zip(ocr_pages, ocr_texts):
+                        ocr_text = (ocr_text or "").strip()
+                        # a short caption over a scanned body: keep whichever says more
+                        if len(ocr_text) > len(page_texts[i]):
+                            page_texts[i] = ocr_text
+                elif ocr_pages:
+                    print(f"[PDFReader] {len(ocr_pages)} low-text page(s) kept as-is: no OCR extractor provided.")
+
+                for i in numbers:
+                    yield i + 1, page_texts[i]
 
     def extract_text(
         self,
@@ -43,29 +101,11 @@ class PDFReader:
         return_pages: bool = False,
         ocr_extractor=None
     ):
-        doc = fitz.open(pdf_path)
-        num_pages = doc.page_count
-
-        full_text = []
-        for page in doc:
-            text = page.get_text("text") or ""
-            if text and text.strip():
-                full_text.append(text)
-            else:
-                full_text.append("")
-
-        if any(p.strip() for p in full_text):
-            native_text = "\n\n".join([f"### PAGE {i+1} ###\n{t.strip()}" for i, t in enumerate(full_text)])
-            if return_pages:
-                return native_text, num_pages
-            return native_text
-
-        # fallback to OCR if no native text
-        if ocr_extractor is None:
+        pages = list(self.iter_pages(pdf_path, ocr_extractor=ocr_extractor))
+        if ocr_extractor is None and pages and not any(t for _, t in pages) and self.mode != "text-only":
             raise ValueError("[PDFReader] PDF appears scanned but no OCR extractor provided.")
 
-        images = self.extract_images(pdf_path)
-        ocr_text = self.extract_text_from_images(images, ocr_extractor)
+        text = "\n\n".join(f"### PAGE {n} ###\n{t}" for n, t in pages)
         if return_pages:
-            return ocr_text, num_pages
-        return ocr_text
+            return text, len(pages)
+        return text
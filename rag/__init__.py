@@ -1,3 +1,10 @@
-from .pipeline import RAGPipeline
-
+# importing the package must not pull in the generator stack
 __all__ = ["RAGPipeline"]
+
+
+def __getattr__(name):
+    if name == "RAGPipeline":
+        from .pipeline import RAGPipeline
+        globals()[name] = RAGPipeline
+        return RAGPipeline
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
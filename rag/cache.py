@@ -0,0 +1,68 @@
+# rag/cache.py
+# In-memory TTL/LRU caches for repeated questions.
+
+import threading
+import time
+from collections import OrderedDict
+
+from embed.cache import normalize_chunk
+
+
+def normalize_query(query: str) -> str:
+    return normalize_chunk(query).lower()
+
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire after `ttl` seconds. Entries are tagged
+    with the vector store generation they were computed against; a lookup
+    under a newer generation drops everything.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._data.clear()
+            self._generation = generation
+
+    def get(self, key, generation=None):
+        with self._lock:
+            self._check_generation(generation)
+            item = self._data.get(key)
+            if item is None or (self.ttl and time.monotonic() - item[0] > self.ttl):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            self._check_generation(generation)
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self._data),
+        }
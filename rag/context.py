@@ -0,0 +1,128 @@
+# rag/context.py
+# Packs retrieved chunks into a token budget for the prompt.
+
+from typing import Callable, List, Tuple
+import re
+import config
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END.split(text.strip()) if s]
+
+
+def merge_overlap(left: str, right: str, min_overlap: int = 20) -> str:
+    """Join consecutive chunks, dropping the text the chunker repeated as overlap."""
+    max_len = min(len(left), len(right), config.CHUNK_OVERLAP * 2)
+    for size in range(max_len, min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + " " + right
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+class ContextPacker:
+    """
+    Turns ranked chunk rows into prompt passages:
+      1. chunks adjacent in the store and on the same page are merged (in
+         document order, at the rank of their best member),
+      2. passages mostly contained in an earlier passage are dropped,
+      3. passages are added best first until `budget` tokens are used; the
+         first one that does not fit is cut at a sentence boundary.
+    Tokens are counted with `count_tokens`, normally the generator tokenizer.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], budget: int = config.CONTEXT_TOKEN_BUDGET,
+                 dedup_threshold: float = config.CONTEXT_DEDUP_THRESHOLD,
+                 min_passage_tokens: int = 16):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.dedup_threshold = dedup_threshold
+        self.min_passage_tokens = min_passage_tokens
+
+    def _group(self, hits, chunks) -> List[dict]:
+        rows = {row: rank for rank, (row, _) in enumerate(hits)}
+        meta = {row: chunks.get(row) for row in rows}
+        passages = []
+        seen = set()
+        for row, _ in hits:
+            if row in seen:
+                continue
+            doc, page = meta[row]["doc_id"], meta[row]["page"]
+            # extend to the whole run of retrieved neighbours on the same page
+            first = row
+            while first - 1 in rows and first - 1 not in seen and \
+                    meta[first - 1]["doc_id"] == doc and meta[first - 1]["page"] == page:
+                first -= 1
+            last = row
+            while last + 1 in rows and last + 1 not in seen and \
+                    meta[last + 1]["doc_id"] == doc and meta[last + 1]["page"] == page:
+                last += 1
+            text = meta[first]["text"].strip()
+            for r in range(first + 1, last + 1):
+                text = merge_overlap(text, meta[r]["text"].strip())
+            seen.update(range(first, last + 1))
+            passages.append({
+                "text": " ".join(text.split()),
+                "rows": list(range(first, last + 1)),
+                "doc_id": doc,
+                "filename": meta[row]["filename"],
+                "page": page,
+                # character span on the page, for citations (-1 if unknown)
+                "start": meta[first].get("start", -1),
+                "end": meta[last].get("end", -1),
+                "rank": min(rows[r] for r in range(first, last + 1)),
+            })
+        passages.sort(key=lambda p: p["rank"])
+        return passages
+
+    def _dedup(self, passages: List[dict]) -> List[dict]:
+        kept, kept_shingles = [], []
+        for p in passages:
+            sh = _shingles(p["text"])
+            duplicate = any(len(sh & other) / max(len(sh), 1) >= self.dedup_threshold for other in kept_shingles)
+            if not duplicate:
+                kept.append(p)
+                kept_shingles.append(sh)
+        return kept
+
+    def _trim(self, text: str, budget: int) -> str:
+        out, used = [], 0
+        for sentence in split_sentences(text):
+            cost = self.count_tokens(sentence + " ")
+            if used + cost > budget:
+                break
+            out.append(sentence)
+            used += cost
+        return " ".join(out)
+
+    def pack(self, hits: List[Tuple[int, float]], chunks) -> List[dict]:
+        """
+        Passages (text, rows, doc_id, filename, page, start, end, tokens) in rank
+        order, within budget. `chunks.get(row)` gives each hit's metadata: a
+        ChunkStore, or a {row: metadata} snapshot of the hit rows.
+        """
+        passages = self._dedup(self._group(hits, chunks))
+        packed, used = [], 0
+        for p in passages:
+            remaining = self.budget - used
+            if remaining < self.min_passage_tokens:
+                break
+            tokens = self.count_tokens(p["text"])
+            if tokens > remaining:
+                p["text"] = self._trim(p["text"], remaining)
+                if not p["text"]:
+                    continue
+                tokens = self.count_tokens(p["text"])
+            p["tokens"] = tokens
+            packed.append(p)
+            used += tokens
+        return packed
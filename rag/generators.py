@@ -0,0 +1,278 @@
+# rag/generators.py
+# Generation backends. Each loads its model on first use, so building a
+# RAGPipeline (and retrieval-only use of it) stays cheap.
+
+from typing import Iterator, List
+from threading import Thread
+import gc
+import re
+import config
+
+
+class Generator:
+    """generate() returns only the new text; stream() yields it piece by piece."""
+
+    name = "base"
+
+    def __init__(self, model_name: str = config.GENERATOR_MODEL):
+        self.model_name = model_name
+
+    def load(self):
+        pass
+
+    def generate(self, prompt: str, max_tokens: int, **params) -> str:
+        return "".join(self.stream(prompt, max_tokens, **params))
+
+    def generate_batch(self, prompts: List[str], max_tokens: int, **params) -> List[str]:
+        return [self.generate(prompt, max_tokens, **params) for prompt in prompts]
+
+    def stream(self, prompt: str, max_tokens: int, **params) -> Iterator[str]:
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+
+class HFGenerator(Generator):
+    """
+    transformers causal LM.
+    quantization="4bit": bitsandbytes NF4 with device_map="auto" (needs CUDA).
+    quantization="int8": fp32 weights on CPU with torch dynamic int8 Linear layers.
+    """
+
+    def __init__(self, model_name: str = config.GENERATOR_MODEL, quantization: str = "4bit",
+                 threads: int = config.GENERATOR_THREADS, stream_timeout: float = config.STREAM_TIMEOUT):
+        super().__init__(model_name)
+        self.name = "hf-4bit" if quantization == "4bit" else "cpu-int8"
+        self.quantization = quantization
+        self.threads = threads
+        self.stream_timeout = stream_timeout
+        self._model = None
+        self._tokenizer = None
+        self.device = None
+
+    def load(self):
+        if self._model is not None:
+            return
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # decoder-only models continue from the right edge; pad batches on the left
+        tokenizer.padding_side = "left"
+
+        if self.quantization == "4bit":
+            from transformers import BitsAndBytesConfig
+            print("[RAG] Loading generator model (4-bit quantized).")
+            quant = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_compute_dtype=torch.float16,
+                bnb_4bit_use_double_quant=True,
+                bnb_4bit_quant_type="nf4"
+            )
+            model = AutoModelForCausalLM.from_pretrained(
+                self.model_name,
+                quantization_config=quant,
+                device_map="auto",
+                offload_folder="offload",
+                offload_state_dict=True
+            )
+            try:
+                self.device = list(model.hf_device_map.values())[0]
+            except Exception:
+                self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        else:
+            print("[RAG] Loading generator model (CPU, dynamic int8).")
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=torch.float32)
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.device = torch.device("cpu")
+
+        model.eval()
+        print("[RAG] Model devices:", getattr(model, "hf_device_map", self.device))
+        self._tokenizer = tokenizer
+        self._model = model
+
+    @property
+    def tokenizer(self):
+        self.load()
+        return self._tokenizer
+
+    @property
+    def model(self):
+        self.load()
+        return self._model
+
+    def _inputs(self, prompt):
+        return self.tokenizer(prompt, return_tensors="pt", padding=True, truncation=True,
+                              max_length=config.PROMPT_MAX_TOKENS).to(self.device)
+
+    def _cleanup(self):
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        gc.collect()
+
+    def generate(self, prompt: str, max_tokens: int, **params) -> str:
+        import torch
+        inputs = self._inputs(prompt)
+        with torch.no_grad():
+            out = self.model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                **params,
+                pad_token_id=self.tokenizer.eos_token_id
+            )
+        new_tokens = out[0][inputs["input_ids"].shape[1]:]
+        text = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+        del inputs, out
+        self._cleanup()
+        return text
+
+    def generate_batch(self, prompts: List[str], max_tokens: int, **params) -> List[str]:
+        """Padded batched decoding; sequences that finish early are padded until the batch is done."""
+        import torch
+        if not prompts:
+            return []
+        inputs = self._inputs(list(prompts))
+        with torch.no_grad():
+            out = self.model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                **params,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+        texts = self.tokenizer.batch_decode(out[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        del inputs, out
+        self._cleanup()
+        return texts
+
+    def _generate_to_streamer(self, inputs, streamer, max_tokens, params, errors):
+        import torch
+        try:
+            with torch.no_grad():
+                self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_tokens,
+                    **params,
+                    streamer=streamer,
+                    pad_token_id=self.tokenizer.eos_token_id
+                )
+        except Exception as e:
+            # unblock the reader; stream() re-raises this
+            errors.append(e)
+            streamer.end()
+
+    def stream(self, prompt: str, max_tokens: int, **params) -> Iterator[str]:
+        from queue import Empty
+        from transformers import TextIteratorStreamer
+        inputs = self._inputs(prompt)
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=self.stream_timeout
+        )
+        errors = []
+        worker = Thread(
+            target=self._generate_to_streamer, args=(inputs, streamer, max_tokens, params, errors), daemon=True
+        )
+        worker.start()
+        timed_out = False
+        try:
+            try:
+                for piece in streamer:
+                    if piece:
+                        yield piece
+            except Empty:
+                timed_out = True
+                raise TimeoutError(f"[HFGenerator] No output for {self.stream_timeout}s while streaming.")
+            if errors:
+                raise errors[0]
+        finally:
+            # a stuck generate() is left to finish on its daemon thread
+            worker.join(0 if timed_out else None)
+            del inputs
+            self._cleanup()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+class GGUFGenerator(Generator):
+    """llama.cpp runner for a local GGUF file (pip install llama-cpp-python). CPU friendly."""
+
+    name = "gguf"
+
+    def __init__(self, model_path: str = config.GGUF_MODEL_PATH, n_ctx: int = config.GGUF_N_CTX,
+                 threads: int = config.GENERATOR_THREADS):
+        super().__init__(model_path)
+        self.n_ctx = n_ctx
+        self.threads = threads
+        self._llm = None
+
+    def load(self):
+        if self._llm is not None:
+            return
+        if not self.model_name:
+            raise ValueError("GENERATOR_BACKEND='gguf' needs config.GGUF_MODEL_PATH")
+        from llama_cpp import Llama
+        print(f"[RAG] Loading GGUF model: {self.model_name}")
+        self._llm = Llama(model_path=self.model_name, n_ctx=self.n_ctx,
+                          n_threads=self.threads or None, verbose=False)
+
+    @property
+    def llm(self):
+        self.load()
+        return self._llm
+
+    def stream(self, prompt: str, max_tokens: int, **params) -> Iterator[str]:
+        # greedy decoding; beam params of the HF backends do not apply
+        for part in self.llm(prompt, max_tokens=max_tokens, temperature=0.0, stream=True):
+            piece = part["choices"][0]["text"]
+            if piece:
+                yield piece
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
+
+
+class StubGenerator(Generator):
+    """
+    Deterministic, model-free backend for tests and benchmarks: answers with
+    the start of the first context snippet in the prompt.
+    """
+
+    name = "stub"
+
+    def __init__(self, model_name: str = "stub"):
+        super().__init__(model_name)
+
+    def stream(self, prompt: str, max_tokens: int, **params) -> Iterator[str]:
+        match = re.search(r"^- (.*)$", prompt, re.MULTILINE)
+        words = (match.group(1) if match else "No context.").split()[:max_tokens]
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+
+
+BACKENDS = ("auto", "hf-4bit", "cpu-int8", "gguf", "stub")
+
+
+def get_generator(backend: str = config.GENERATOR_BACKEND, model_name: str = config.GENERATOR_MODEL) -> Generator:
+    """Build (but do not load) the configured backend."""
+    if backend == "auto":
+        # bitsandbytes 4-bit needs CUDA; fall back to the CPU int8 path
+        try:
+            import torch
+            backend = "hf-4bit" if torch.cuda.is_available() else "cpu-int8"
+        except ImportError:
+            backend = "gguf"
+    if backend == "hf-4bit":
+        return HFGenerator(model_name, quantization="4bit")
+    if backend == "cpu-int8":
+        return HFGenerator(model_name, quantization="int8")
+    if backend == "gguf":
+        return GGUFGenerator()
+    if backend == "stub":
+        return StubGenerator()
+    raise ValueError(f"unknown generator backend {backend!r}; expected one of {BACKENDS}")
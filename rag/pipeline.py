@@ -1,49 +1,69 @@
 # rag/pipeline.py
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
+import threading
+import time
+import numpy as np
 from embed.vectorizer import VectorStore
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-import torch
-import gc
+from rag.cache import TTLCache, normalize_query
+from rag.context import ContextPacker
+from rag.generators import Generator, get_generator
+from utils.tracing import tracer
 import config
 
 class RAGPipeline:
-    def __init__(self, vector_store: VectorStore, generator_model: str = config.GENERATOR_MODEL):
+    def __init__(self, vector_store: VectorStore, generator_model: str = config.GENERATOR_MODEL,
+                 backend: str = config.GENERATOR_BACKEND):
         self.vs = vector_store
-        print("[RAG] Loading generator model (4-bit quantized).")
+        self.generator_model = generator_model
+        self.backend = backend
+        # built and loaded on the first generate; retrieval never touches it
+        self._generator = None
+        self.gen_params = {"do_sample": False, "num_beams": 2}
+        # beam search cannot hand out tokens before it finishes; streaming decodes greedily
+        self.stream_gen_params = {"do_sample": False, "num_beams": 1}
+        # timings of the last stream_query (ttft, tokens, tokens_per_sec, total, cached),
+        # kept per thread since one pipeline serves every Streamlit session
+        self._stream_local = threading.local()
 
-        self.tokenizer = AutoTokenizer.from_pretrained(generator_model)
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
+        # L1: normalized query -> embedding + retrieved rows
+        # L2: (query, rows, model, decoding params) -> answer
+        # both are dropped whenever the vector store changes
+        self.retrieval_cache = TTLCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL)
+        self.answer_cache = TTLCache(config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_TTL)
+        self._packer = None
 
-        quant = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_compute_dtype=torch.float16,
-            bnb_4bit_use_double_quant=True,
-            bnb_4bit_quant_type="nf4"
-        )
-        self.model = AutoModelForCausalLM.from_pretrained(
-            generator_model,
-            quantization_config=quant,
-            device_map="auto",
-            offload_folder="offload",
-            offload_state_dict=True
-        )
-        self.model.eval()
-        
-        try:
-            self.device = list(self.model.hf_device_map.values())[0]
-        except Exception:
-            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        print("[RAG] Model devices:", getattr(self.model, "hf_device_map", "unknown"))
-
-    def build_prompt(self, query: str, retrieved: List[Tuple[str, float]]) -> str:
-        # take top 5 high relevance chunks and compress them by truncating to 200 chars
-        caps = []
-        for chunk, score in retrieved[:5]:
-            snippet = chunk.strip()[:200]
-            caps.append(f"- {snippet} (score={score:.3f})")
-
-        context = "\n".join(caps)
+    @property
+    def last_stream_stats(self) -> dict:
+        """Timings of this thread's most recent stream_query()."""
+        return getattr(self._stream_local, "stats", None)
+
+    @property
+    def generator(self) -> Generator:
+        if self._generator is None:
+            self._generator = get_generator(self.backend, self.generator_model)
+            print(f"[RAG] Generator backend: {self._generator.name}")
+        return self._generator
+
+    @property
+    def packer(self) -> ContextPacker:
+        if self._packer is None:
+            self._packer = ContextPacker(self.generator.count_tokens)
+        return self._packer
+
+    def pack_context(self, hits: List[Tuple[int, float]]) -> List[dict]:
+        with tracer.span("rag.pack_context", hits=len(hits)):
+            # the tokenizer may load the whole model on first use: never under the store lock
+            self.generator.load()
+            with self.vs.reading():
+                # only copy the hit rows under the lock; packing and token counting run outside it
+                rows = {row: self.vs.chunks.get(row) for row, _ in hits}
+            passages = self.packer.pack(hits, rows)
+            tracer.count("context_tokens", sum(p["tokens"] for p in passages))
+        return passages
+
+    def build_prompt(self, query: str, passages: List[dict]) -> str:
+        # passages come from pack_context: merged, de-duplicated and within the token budget
+        context = "\n".join(f"- {p['text']}" for p in passages)
         prompt = f"""You are a concise assistant. Use ONLY the context to answer the question. Do NOT invent facts.
 
 ### Context
@@ -55,35 +75,205 @@ class RAGPipeline:
 ### Answer:"""
         return prompt
 
-    def generate(self, prompt: str, max_tokens: int = config.MAX_GENERATION_TOKENS) -> str:
-        inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=1600).to(self.device)
-        with torch.no_grad():
-            out = self.model.generate(
-                **inputs,
-                max_new_tokens=max_tokens,
-                do_sample=False,
-                num_beams=2,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-        decoded = self.tokenizer.decode(out[0], skip_special_tokens=True)
+    def _clean_answer(self, decoded: str) -> str:
         if "### Answer" in decoded:
             decoded = decoded.split("### Answer", 1)[-1].strip()
 
         # cleanup
         lines = [l.strip() for l in decoded.splitlines() if l.strip()]
         answer = " ".join(dict.fromkeys(lines))  # preserve order
-        # free memory
-        del inputs, out
-        torch.cuda.empty_cache()
-        gc.collect()
         return answer
 
-    def query(self, user_query: str, top_k: int = 10) -> str:
-        retrieved = self.vs.search(user_query, top_k=top_k)
+    def generate(self, prompt: str, max_tokens: int = config.MAX_GENERATION_TOKENS) -> str:
+        with tracer.span("rag.generate", backend=self.backend):
+            decoded = self.generator.generate(prompt, max_tokens, **self.gen_params)
+            if tracer.enabled:
+                tracer.count("generated_tokens", self.generator.count_tokens(decoded))
+        return self._clean_answer(decoded)
+
+    def generate_batch(self, prompts: List[str], max_tokens: int = config.MAX_GENERATION_TOKENS,
+                       batch_size: int = config.GENERATE_BATCH_SIZE) -> List[str]:
+        answers = []
+        for i in range(0, len(prompts), max(1, batch_size)):
+            with tracer.span("rag.generate", backend=self.backend, prompts=len(prompts[i:i + batch_size])):
+                decoded = self.generator.generate_batch(prompts[i:i + batch_size], max_tokens, **self.gen_params)
+                if tracer.enabled:
+                    tracer.count("generated_tokens", sum(self.generator.count_tokens(d) for d in decoded))
+            answers.extend(self._clean_answer(d) for d in decoded)
+        return answers
+
+    def retrieve(self, user_query: str, top_k: int = 10, doc_id: str = None,
+                 pages=None) -> List[Tuple[int, float]]:
+        """
+        Retrieved chunk rows [(row, score)], served from the L1 cache when possible.
+        `doc_id` / `pages` restrict retrieval to one document or some of its pages.
+        """
+        return self.retrieve_batch([user_query], top_k=top_k, doc_id=doc_id, pages=pages)[0]
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 10, doc_id: str = None,
+                       pages=None) -> List[List[Tuple[int, float]]]:
+        """
+        retrieve() for many queries: uncached queries are embedded in one encode
+        call and searched with one batched index search.
+        """
+        with tracer.span("rag.retrieve", queries=len(queries), top_k=top_k):
+            return self._retrieve_batch(queries, top_k, doc_id, pages)
+
+    def _retrieve_batch(self, queries, top_k, doc_id=None, pages=None):
+        hybrid = config.HYBRID_SEARCH and self.vs.lexical is not None
+        scope = None if doc_id is None else (doc_id, None if pages is None else tuple(sorted(set(pages))))
+        hits_key = (hybrid, top_k, scope)
+        generation = self.vs.generation
+        entries = {}
+        for q in queries:
+            key = normalize_query(q)
+            if key not in entries:
+                entries[key] = (q, self.retrieval_cache.get(key, generation))
+
+        to_embed = [key for key, (_, entry) in entries.items() if entry is None]
+        if to_embed:
+            embeddings = self.vs.embed_queries([entries[key][0] for key in to_embed])
+            for key, emb in zip(to_embed, embeddings):
+                entry = {"embedding": emb[None, :], "hits": {}}
+                entries[key] = (entries[key][0], entry)
+                self.retrieval_cache.put(key, entry, generation)
+
+        to_search = [key for key, (_, entry) in entries.items() if hits_key not in entry["hits"]]
+        if to_search:
+            texts = [entries[key][0] for key in to_search]
+            q_embs = np.concatenate([entries[key][1]["embedding"] for key in to_search])
+            if hybrid:
+                found = self.vs.hybrid_search_rows_batch(texts, top_k=top_k, q_embs=q_embs, doc_id=doc_id, pages=pages)
+            else:
+                found = self.vs.search_rows_batch(texts, top_k=top_k, q_embs=q_embs, doc_id=doc_id, pages=pages)
+            for key, hits in zip(to_search, found):
+                entries[key][1]["hits"][hits_key] = hits
+
+        return [entries[normalize_query(q)][1]["hits"][hits_key] for q in queries]
+
+    def _answer_key(self, user_query, hits, max_tokens, gen_params):
+        return (
+            normalize_query(user_query),
+            tuple(row for row, _ in hits),
+            self.backend,
+            self.generator_model,
+            max_tokens,
+            tuple(sorted(gen_params.items())),
+        )
+
+    def query(self, user_query: str, top_k: int = 10, max_tokens: int = config.MAX_GENERATION_TOKENS,
+              doc_id: str = None, pages=None) -> str:
+        with tracer.span("rag.query", top_k=top_k):
+            return self._query(user_query, top_k, max_tokens, doc_id, pages)
+
+    def _query(self, user_query, top_k, max_tokens, doc_id=None, pages=None):
+        hits = self.retrieve(user_query, top_k=top_k, doc_id=doc_id, pages=pages)
         # filter by reasonable relevance (lower distance -> more similar; adjust if using L2)
         # here we keep first top_k and trust faiss ordering; if distances are large, return fallback
-        if not retrieved:
+        if not hits:
             return "I don't have enough information to answer that."
 
-        prompt = self.build_prompt(user_query, retrieved)
-        return self.generate(prompt)
+        generation = self.vs.generation
+        key = self._answer_key(user_query, hits, max_tokens, self.gen_params)
+        answer = self.answer_cache.get(key, generation)
+        if answer is not None:
+            tracer.count("answer_cache_hits")
+            return answer
+
+        prompt = self.build_prompt(user_query, self.pack_context(hits))
+        answer = self.generate(prompt, max_tokens=max_tokens)
+        self.answer_cache.put(key, answer, generation)
+        return answer
+
+    def query_batch(self, queries: List[str], top_k: int = 10,
+                    max_tokens: int = config.MAX_GENERATION_TOKENS) -> List[str]:
+        """
+        Answer many questions at once: batched retrieval, then padded batched
+        generation of every answer that is not already cached.
+        """
+        queries = list(queries)
+        with tracer.span("rag.query_batch", queries=len(queries), top_k=top_k):
+            return self._query_batch(queries, top_k, max_tokens)
+
+    def _query_batch(self, queries, top_k, max_tokens):
+        all_hits = self.retrieve_batch(queries, top_k=top_k)
+        generation = self.vs.generation
+        answers = [None] * len(queries)
+        pending = {}  # answer key -> (prompt, [positions])
+        for i, (q, hits) in enumerate(zip(queries, all_hits)):
+            if not hits:
+                answers[i] = "I don't have enough information to answer that."
+                continue
+            key = self._answer_key(q, hits, max_tokens, self.gen_params)
+            if key in pending:
+                pending[key][1].append(i)
+                continue
+            cached = self.answer_cache.get(key, generation)
+            if cached is not None:
+                tracer.count("answer_cache_hits")
+                answers[i] = cached
+                continue
+            pending[key] = (self.build_prompt(q, self.pack_context(hits)), [i])
+
+        if pending:
+            keys = list(pending)
+            generated = self.generate_batch([pending[key][0] for key in keys], max_tokens=max_tokens)
+            for key, answer in zip(keys, generated):
+                self.answer_cache.put(key, answer, generation)
+                for i in pending[key][1]:
+                    answers[i] = answer
+        return answers
+
+    def stream_generate(self, prompt: str, max_tokens: int = config.MAX_GENERATION_TOKENS) -> Iterator[str]:
+        """Yield answer text pieces as the model decodes them."""
+        yield from self.generator.stream(prompt, max_tokens, **self.stream_gen_params)
+
+    def stream_query(self, user_query: str, top_k: int = 10, max_tokens: int = config.MAX_GENERATION_TOKENS,
+                     doc_id: str = None, pages=None) -> Iterator[str]:
+        """
+        Like query(), but yields the answer incrementally. Timings are left in
+        last_stream_stats once the generator is exhausted; ttft is measured from
+        the call, so it includes retrieval.
+        """
+        start = time.perf_counter()
+        stats = {"ttft": None, "tokens": 0, "tokens_per_sec": 0.0, "total": 0.0, "cached": False}
+        self._stream_local.stats = stats
+
+        hits = self.retrieve(user_query, top_k=top_k, doc_id=doc_id, pages=pages)
+        if not hits:
+            stats["ttft"] = stats["total"] = time.perf_counter() - start
+            yield "I don't have enough information to answer that."
+            return
+
+        generation = self.vs.generation
+        key = self._answer_key(user_query, hits, max_tokens, self.stream_gen_params)
+        answer = self.answer_cache.get(key, generation)
+        if answer is not None:
+            stats["ttft"] = stats["total"] = time.perf_counter() - start
+            stats["cached"] = True
+            yield answer
+            return
+
+        prompt = self.build_prompt(user_query, self.pack_context(hits))
+        pieces = []
+        for piece in self.stream_generate(prompt, max_tokens=max_tokens):
+            if stats["ttft"] is None:
+                stats["ttft"] = time.perf_counter() - start
+            pieces.append(piece)
+            yield piece
+
+        stats["total"] = time.perf_counter() - start
+        if stats["ttft"] is None:
+            # nothing was emitted (e.g. immediate EOS)
+            stats["ttft"] = stats["total"]
+        answer = "".join(pieces).strip()
+        stats["tokens"] = self.generator.count_tokens(answer) if answer else 0
+        tracer.count("generated_tokens", stats["tokens"])
+        decode_time = stats["total"] - (stats["ttft"] or stats["total"])
+        if decode_time > 0 and stats["tokens"] > 1:
+            # the first token's latency is in ttft
+            stats["tokens_per_sec"] = (stats["tokens"] - 1) / decode_time
+        self.answer_cache.put(key, answer, generation)
+
+    def cache_stats(self) -> dict:
+        return {"retrieval": self.retrieval_cache.stats(), "answer": self.answer_cache.stats()}
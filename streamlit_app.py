@@ -1,11 +1,11 @@
 # streamlit_app.py
 import streamlit as st
 import os
-import time
 import uuid
 from library.manager import DocumentManager
 from embed.vectorizer import VectorStore
 from rag.pipeline import RAGPipeline
+from utils.tracing import tracer
 import config
 
 
@@ -76,13 +76,6 @@ st.markdown("""
 
 
 
-# BACKEND SPINNER (model load)
-
-with st.spinner("Initializing DocInferX... Loading models, OCR engine, vector store..."):
-    time.sleep(1.2)
-
-
-
 # MAIN UI STYLE
 
 st.markdown("""
@@ -151,7 +144,11 @@ def load_vector_store():
     return VectorStore(
         model_name=config.EMBED_MODEL_NAME,
         index_path=config.INDEX_PATH,
-        meta_path=config.META_PATH
+        index_dir=config.INDEX_DIR,
+        meta_path=config.META_PATH,
+        chunk_dir=config.CHUNK_STORE_DIR,
+        cache_path=config.EMBED_CACHE_PATH,
+        cache_max_bytes=config.EMBED_CACHE_MAX_BYTES
     )
 
 @st.cache_resource
@@ -159,14 +156,19 @@ def load_rag(_vs):
     return RAGPipeline(_vs)
 
 @st.cache_resource
-def load_doc_manager():
-    return DocumentManager(config.LIBRARY_META_PATH)
+def load_doc_manager(_vs):
+    return DocumentManager(config.LIBRARY_DB_PATH, vector_store=_vs)
+
+@st.cache_resource
+def load_ingest_queue(_dm):
+    # shared by all sessions; uploads are indexed here while other users search
+    from library.jobs import IngestQueue
+    return IngestQueue(_dm)
 
 
-# Init
+# Init: models (embedder, OCR, generator) load on first use, not here
 vs = load_vector_store()
-rag = load_rag(vs)
-dm = load_doc_manager()
+dm = load_doc_manager(vs)
 
 
 
@@ -190,23 +192,39 @@ if menu == "Upload Document":
 
     uploaded = st.file_uploader("Upload PDF or Image:", type=["pdf", "png", "jpg", "jpeg"])
 
-    if uploaded:
-        save_path = os.path.join(config.UPLOAD_DIR, uploaded.name)
+    ingest_queue = load_ingest_queue(dm)
+
+    # reruns keep the file in the widget: submit each upload once
+    upload_key = uploaded and (getattr(uploaded, "file_id", None) or (uploaded.name, uploaded.size))
+    if uploaded and st.session_state.get("upload_key") != upload_key:
+        # a directory per upload: a later file with the same name must not
+        # overwrite one a queued job is still reading (the name is kept for the library)
+        save_dir = os.path.join(config.UPLOAD_DIR, uuid.uuid4().hex)
+        os.makedirs(save_dir)
+        save_path = os.path.join(save_dir, os.path.basename(uploaded.name))
         with open(save_path, "wb") as f:
             f.write(uploaded.read())
-
-        st.success("File uploaded.")
-        doc_id = str(uuid.uuid4())
-
-        with st.spinner("Processing document..."):
-            progress = st.progress(0)
-            chunks = dm.ingest_document(save_path, doc_id)
-            progress.progress(50)
-            stored = vs.add_with_return(chunks, doc_id, uploaded.name, len(chunks))
-            progress.progress(100)
-
-        vs.save()
-        st.success(f"Indexed {len(stored)} chunks.")
+        st.session_state["upload_key"] = upload_key
+        st.session_state.setdefault("upload_jobs", []).append(ingest_queue.submit(save_path))
+        st.success("File uploaded; indexing runs in the background.")
+
+    jobs = [ingest_queue.status(j) for j in st.session_state.get("upload_jobs", [])]
+    jobs = [j for j in jobs if j is not None]
+    if jobs:
+        st.markdown("### Indexing status")
+        for job in reversed(jobs):
+            if job["state"] in ("queued", "running"):
+                done, total = job["pages_done"], job["pages"] or 0
+                st.progress(min(done / total, 1.0) if total else 0.0,
+                            text=f"{job['name']}: {job['state']} ({done}/{total or '?'} pages)")
+            elif job["state"] == "done":
+                st.success(f"{job['name']}: indexed {job['chunks']} chunks.")
+            elif job["state"] == "duplicate":
+                st.info(f"{job['name']}: already in the library ({job['doc_id']}); nothing to index.")
+            else:
+                st.error(f"{job['name']}: failed ({job.get('error')}).")
+        if any(j["state"] in ("queued", "running") for j in jobs):
+            st.button("Refresh status")
 
 
 # CHAT
@@ -214,15 +232,34 @@ if menu == "Upload Document":
 elif menu == "Chat":
     st.markdown("## 💬 Chat With Your Documents")
 
+    rag = load_rag(vs)
     query = st.text_input("Ask anything:")
 
     if st.button("Search") and query:
-        with st.spinner("Processing..."):
-            progress = st.progress(0)
-            answer = rag.query(query)
-            progress.progress(100)
-
-        st.markdown(f'<div class="answer-bubble">{answer}</div>', unsafe_allow_html=True)
+        bubble = st.empty()
+        answer, timed_out = "", False
+        try:
+            with st.spinner("Searching..."):
+                stream = rag.stream_query(query)
+                # retrieval and prompt prefill happen before the first piece arrives
+                answer = next(stream, "")
+            bubble.markdown(f'<div class="answer-bubble">{answer}▌</div>', unsafe_allow_html=True)
+            for piece in stream:
+                answer += piece
+                bubble.markdown(f'<div class="answer-bubble">{answer}▌</div>', unsafe_allow_html=True)
+        except TimeoutError:
+            timed_out = True
+        if answer or not timed_out:
+            bubble.markdown(f'<div class="answer-bubble">{answer}</div>', unsafe_allow_html=True)
+
+        if timed_out:
+            st.error("The model stopped responding before the answer was finished. Please try again.")
+        else:
+            stats = rag.last_stream_stats
+            st.caption(
+                f"First token {stats['ttft']:.2f}s · {stats['tokens']} tokens · "
+                f"{stats['tokens_per_sec']:.1f} tok/s" + (" · cached" if stats["cached"] else "")
+            )
 
 
 # LIBRARY
@@ -230,11 +267,16 @@ elif menu == "Chat":
 elif menu == "Library":
     st.markdown("## 📚 Your Library")
 
-    docs = dm.list_documents()
+    total = dm.count_documents()
 
-    if not docs:
+    if not total:
         st.warning("No documents uploaded.")
     else:
+        # one page of records at a time; the library can hold many thousands
+        page_size = 20
+        n_pages = (total + page_size - 1) // page_size
+        page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1)
+        docs = dm.list_documents(offset=(page - 1) * page_size, limit=page_size)
         for d in docs:
             st.markdown(
                 f"""
@@ -247,3 +289,13 @@ elif menu == "Library":
                 """,
                 unsafe_allow_html=True
             )
+            if st.button("Delete", key=f"delete_{d['doc_id']}"):
+                dm.delete_document(d["doc_id"])
+                st.rerun()
+
+
+# TRACING
+
+# with DOCINFERX_TRACE=1, refresh the metrics snapshot after every rerun
+if tracer.enabled:
+    tracer.write_metrics()
@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config creates its data dir on import; keep the suite away from the real data/
+os.environ.setdefault("DOCINFERX_DATA_DIR", tempfile.mkdtemp(prefix="docinferx-tests-"))
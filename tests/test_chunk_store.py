@@ -0,0 +1,102 @@
+# tests/test_chunk_store.py
+import os
+
+import numpy as np
+import pytest
+
+from embed.chunk_store import ChunkStore
+
+
+def test_rows_survive_reopen(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append(["alpha", "beta"], "doc1", "a.pdf", 2, page_numbers=[1, 2], spans=[(0, 5), (6, 10)])
+    store.flush()
+
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 2
+    row = store.get(1)
+    assert (row["doc_id"], row["text"], row["page"], row["start"], row["end"]) == ("doc1", "beta", 2, 6, 10)
+
+
+def test_torn_flush_is_dropped_on_reopen(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append(["alpha"], "doc1", "a.pdf", 1)
+    store.flush()
+    store.append(["beta", "gamma"], "doc1", "a.pdf", 1)
+    store.flush()
+    # text.off is written last: lose the end of it, as if the process died mid-flush
+    off = os.path.join(str(tmp_path), "text.off")
+    with open(off, "r+b") as f:
+        f.truncate(os.path.getsize(off) - 4)
+
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 2
+    assert [store.text(r) for r in range(2)] == ["alpha", "beta"]
+    for name, dtype in ChunkStore.COLUMNS.items():
+        assert os.path.getsize(os.path.join(str(tmp_path), name)) == 2 * np.dtype(dtype).itemsize
+
+
+def test_flush_without_log_append_is_realigned(tmp_path):
+    # VectorStore.save flushes chunk rows before logging their vectors; a crash
+    # in between leaves rows the index never got, which load truncates away
+    store = ChunkStore(str(tmp_path))
+    store.append(["alpha", "beta"], "doc1", "a.pdf", 1)
+    store.flush()
+    store.append(["orphan"], "doc2", "b.pdf", 1)
+    store.flush()
+
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 3
+    store.truncate(2)
+    assert len(store) == 2
+
+    store.append(["gamma"], "doc3", "c.pdf", 1)
+    store.flush()
+    store = ChunkStore(str(tmp_path))
+    assert [store.text(r) for r in range(3)] == ["alpha", "beta", "gamma"]
+    assert store.get(2)["doc_id"] == "doc3"
+
+
+def test_delete_doc_persists(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append(["alpha"], "doc1", "a.pdf", 1)
+    store.append(["beta"], "doc2", "b.pdf", 1)
+    store.flush()
+    assert store.delete_doc("doc1")
+    store.flush()
+
+    store = ChunkStore(str(tmp_path))
+    assert list(store.live_mask(np.arange(2))) == [False, True]
+    assert len(store.rows_for_doc("doc1")) == 0
+
+
+def test_vector_store_drops_rows_flushed_without_log(tmp_path, monkeypatch):
+    pytest.importorskip("faiss")
+    from embed.vectorizer import VectorStore
+
+    # no embedding model here: give an empty store a fixed dimension
+    monkeypatch.setattr(VectorStore, "emb_dim", property(lambda self: self._emb_dim or 8))
+
+    def open_store():
+        return VectorStore(
+            index_path=str(tmp_path / "index.faiss"),
+            index_dir=str(tmp_path / "index"),
+            meta_path=str(tmp_path / "metadata.npy"),
+            chunk_dir=str(tmp_path / "chunks"),
+            lexical_path=str(tmp_path / "lexical.sqlite"),
+            index_engine="flat",
+        )
+
+    rng = np.random.default_rng(0)
+    vs = open_store()
+    vs.add_embeddings(rng.standard_normal((2, 8)), ["alpha one", "beta two"], "doc1", "a.pdf", 1)
+    vs.save()
+    vs.add_embeddings(rng.standard_normal((1, 8)), ["orphan three"], "doc2", "b.pdf", 1)
+    vs.chunks.flush()  # the crash: rows on disk, vectors never logged
+    vs.lexical.commit()
+
+    vs = open_store()
+    assert len(vs.chunks) == 2
+    assert vs.index.ntotal == 2
+    assert vs.lexical.max_row() == 1
+    assert vs.lexical.search("orphan") == []
@@ -0,0 +1,123 @@
+# tests/test_lexical.py
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from embed.lexical import BM25Index, tokenize
+
+WORDS = ["widget", "manual", "invoice", "gear", "pump", "valve", "motor", "filter", "seal", "bolt"]
+
+
+def brute_force(index, docs, query, top_k=10):
+    """BM25 over the live rows in `docs` {row: text}, with the index's common-term rule."""
+    counts = {row: Counter(tokenize(text)) for row, text in docs.items()}
+    n = len(counts)
+    if not n:
+        return {}
+    avg_len = sum(sum(c.values()) for c in counts.values()) / n
+    dfs = {t: sum(t in c for c in counts.values()) for t in dict.fromkeys(tokenize(query))}
+    dfs = {t: df for t, df in dfs.items() if df}
+    rare = {t: df for t, df in dfs.items() if df <= index.max_df_ratio * n}
+    scores = Counter()
+    for term, df in (rare or dfs).items():
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for row, c in counts.items():
+            tf = c[term]
+            if tf:
+                length = sum(c.values())
+                scores[row] += idf * tf * (index.k1 + 1) / (tf + index.k1 * (1 - index.b + index.b * length / avg_len))
+    return dict(scores.most_common(top_k))
+
+
+def assert_matches(index, docs, query, top_k=10):
+    got = index.search(query, top_k)
+    expected = brute_force(index, docs, query, top_k)
+    # ties may come back in either order: compare the score ranking and each row's score
+    assert [s for _, s in got] == pytest.approx(sorted(expected.values(), reverse=True))
+    all_scores = brute_force(index, docs, query, top_k=len(docs))
+    for row, score in got:
+        assert score == pytest.approx(all_scores[row])
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = BM25Index(str(tmp_path / "lexical.sqlite"))
+    yield idx
+    idx.close()
+
+
+def test_removed_rows_do_not_make_a_term_common(index):
+    docs = {r: "widget" for r in range(100)}
+    docs[100] = "widget manual"
+    docs.update({r: "filler text" for r in range(101, 105)})
+    docs[105] = "widget manual guide"
+    index.add(list(docs), list(docs.values()))
+    index.commit()
+
+    index.remove(range(100))
+    index.commit()
+    for r in range(100):
+        del docs[r]
+    assert {r for r, _ in index.search("widget manual")} == {100, 105}
+    assert_matches(index, docs, "widget manual")
+
+    index.compact()
+    assert_matches(index, docs, "widget manual")
+
+
+def test_remove_from_purges_reused_rows(index):
+    index.add(range(10), [f"pump {i}" for i in range(10)])
+    index.commit()
+    index.remove_from(6)
+    index.add(range(6, 9), ["valve"] * 3)
+    index.commit()
+
+    assert index.max_row() == 8
+    assert {r for r, _ in index.search("pump")} == set(range(6))
+    assert {r for r, _ in index.search("valve")} == {6, 7, 8}
+
+
+def test_scoped_search(index):
+    index.add(range(20), ["gear seal"] * 10 + ["gear"] * 10)
+    index.commit()
+    assert {r for r, _ in index.search("seal", rows=[1, 3, 15])} == {1, 3}
+
+
+def test_matches_brute_force_through_merges_removes_and_reopen(tmp_path):
+    rng = random.Random(7)
+    path = str(tmp_path / "lexical.sqlite")
+    index = BM25Index(path, merge_at=2)
+    docs, next_row = {}, 0
+    queries = [" ".join(rng.sample(WORDS, 2)) for _ in range(20)]
+
+    def check():
+        for q in queries:
+            assert_matches(index, docs, q)
+
+    for step in range(40):
+        texts = [" ".join(rng.choices(WORDS[:rng.randint(2, len(WORDS))], k=rng.randint(1, 8))) for _ in range(rng.randint(1, 15))]
+        rows = list(range(next_row, next_row + len(texts)))
+        index.add(rows, texts)
+        docs.update(zip(rows, texts))
+        next_row += len(texts)
+        if step % 5 == 4 and docs:
+            gone = rng.sample(sorted(docs), k=len(docs) // 4)
+            index.remove(gone)
+            for r in gone:
+                del docs[r]
+        if step % 13 == 12:
+            cut = next_row - 5
+            index.remove_from(cut)
+            docs = {r: t for r, t in docs.items() if r < cut}
+            next_row = cut
+        index.commit()
+        check()
+
+    index.compact()
+    check()
+    index.close()
+    index = BM25Index(path, merge_at=2)
+    check()
+    index.close()
@@ -0,0 +1,77 @@
+# tests/test_rwlock.py
+import threading
+import time
+
+import pytest
+
+from utils.rwlock import RWLock
+
+
+def in_thread(fn):
+    """Start fn in a thread; the returned event is set once fn has returned."""
+    done = threading.Event()
+
+    def run():
+        fn()
+        done.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return done
+
+
+def test_readers_share():
+    lock = RWLock()
+    with lock.read():
+        assert in_thread(lock.acquire_read).wait(1)
+
+
+def test_writer_excludes_readers():
+    lock = RWLock()
+    with lock.write():
+        reader = in_thread(lock.acquire_read)
+        assert not reader.wait(0.1)
+    assert reader.wait(1)
+
+
+def test_nested_read_does_not_wait_for_a_queued_writer():
+    lock = RWLock()
+    with lock.read():
+        writer = in_thread(lock.acquire_write)
+        time.sleep(0.05)  # the writer is now waiting
+        with lock.read():
+            pass
+        assert not writer.wait(0.05)
+    assert writer.wait(1)
+
+
+def test_queued_writer_blocks_new_readers():
+    lock = RWLock()
+    lock.acquire_read()
+    writer = in_thread(lock.acquire_write)
+    time.sleep(0.05)
+    reader = in_thread(lock.acquire_read)
+    assert not reader.wait(0.1)
+    lock.release_read()
+    assert writer.wait(1)
+    assert not reader.wait(0.05)
+
+
+def test_write_is_reentrant_and_may_read():
+    lock = RWLock()
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                pass
+        # still held after the inner release
+        assert not in_thread(lock.acquire_read).wait(0.1)
+    assert in_thread(lock.acquire_write).wait(1)
+
+
+def test_upgrade_raises_and_leaves_the_lock_usable():
+    lock = RWLock()
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    with lock.write():
+        pass
+    assert in_thread(lock.acquire_write).wait(1)
@@ -0,0 +1,89 @@
+# tests/test_wal.py
+import os
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from embed import ann
+from embed.wal import IndexLog
+
+DIM = 4
+
+
+def vectors(n, seed):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def load(path):
+    log = IndexLog(path)
+    index = log.load(lambda dim: ann.empty_index(dim or DIM))
+    return log, index
+
+
+def test_replay_restores_adds_and_removes(tmp_path):
+    log = IndexLog(str(tmp_path))
+    log.append_add(np.arange(3), vectors(3, 0))
+    log.append_add(np.arange(3, 5), vectors(2, 1))
+    log.append_remove(np.array([1]))
+
+    log, index = load(str(tmp_path))
+    assert log.seq == 3
+    assert sorted(ann.index_ids(index)) == [0, 2, 3, 4]
+
+
+def test_truncated_tail_is_cut_and_log_stays_appendable(tmp_path):
+    log = IndexLog(str(tmp_path))
+    log.append_add(np.arange(3), vectors(3, 0))
+    intact = log.wal_bytes
+    log.append_add(np.arange(3, 5), vectors(2, 1))
+    # a crash in the middle of writing the second record
+    with open(log.wal_path, "r+b") as f:
+        f.truncate(intact + 10)
+
+    log, index = load(str(tmp_path))
+    assert log.seq == 1
+    assert sorted(ann.index_ids(index)) == [0, 1, 2]
+    assert os.path.getsize(log.wal_path) == intact
+
+    assert log.append_add(np.arange(3, 5), vectors(2, 1)) == 2
+    log, index = load(str(tmp_path))
+    assert sorted(ann.index_ids(index)) == [0, 1, 2, 3, 4]
+
+
+def test_corrupt_record_ends_replay(tmp_path):
+    log = IndexLog(str(tmp_path))
+    log.append_add(np.arange(2), vectors(2, 0))
+    intact = log.wal_bytes
+    log.append_add(np.arange(2, 4), vectors(2, 1))
+    with open(log.wal_path, "r+b") as f:
+        f.seek(intact + 40)
+        byte = f.read(1)
+        f.seek(intact + 40)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    log, index = load(str(tmp_path))
+    assert sorted(ann.index_ids(index)) == [0, 1]
+    assert log.wal_bytes == intact
+
+
+def test_snapshot_keeps_only_newer_records(tmp_path):
+    log = IndexLog(str(tmp_path))
+    index = ann.empty_index(DIM)
+    for seed, ids in enumerate((np.arange(2), np.arange(2, 4))):
+        v = vectors(len(ids), seed)
+        log.append_add(ids, v)
+        index.add_with_ids(v, ids)
+    log.write_snapshot(faiss.serialize_index(index), log.seq)
+    log.append_add(np.arange(4, 6), vectors(2, 2))
+
+    log, index = load(str(tmp_path))
+    assert log.base_seq == 2 and log.seq == 3
+    assert sorted(ann.index_ids(index)) == [0, 1, 2, 3, 4, 5]
+
+
+def test_empty_directory_builds_empty_index(tmp_path):
+    log, index = load(str(tmp_path / "index"))
+    assert not log.exists()
+    assert index.ntotal == 0 and index.d == DIM
@@ -0,0 +1,135 @@
+# utils/disk_cache.py
+# Small SQLite-backed key/value cache with size-bounded LRU eviction.
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class DiskLRUCache:
+    """
+    Persistent byte cache. Entries are evicted least-recently-used first
+    once the stored payload exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL, atime REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries(atime)")
+        self.conn.commit()
+        row = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        self.total_bytes = int(row[0])
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys present in the cache."""
+        found = {}
+        if not keys:
+            return found
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({marks})", part
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE entries SET atime = ? WHERE key = ?",
+                    [(now, k) for k in found]
+                )
+                self.conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items):
+        """Insert or refresh (key, value) pairs, then evict if over budget."""
+        # the last value for a repeated key wins, and is counted once
+        items = list(dict(items).items())
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            keys = [k for k, _ in items]
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                marks = ",".join("?" * len(part))
+                row = self.conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM entries WHERE key IN ({marks})", part
+                ).fetchone()
+                self.total_bytes -= int(row[0])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, atime) VALUES (?, ?, ?, ?)",
+                [(k, sqlite3.Binary(v), len(v), now) for k, v in items]
+            )
+            self.total_bytes += sum(len(v) for _, v in items)
+            self._evict()
+            self.conn.commit()
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM entries ORDER BY atime ASC LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            freed = 0
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                freed += size
+                if self.total_bytes - freed <= self.max_bytes:
+                    break
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self.total_bytes -= freed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+            self.total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,80 @@
+# utils/rwlock.py
+# Readers-writer lock: many concurrent readers or one writer.
+
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+    Writer-preferring readers-writer lock. Once a writer is waiting, new
+    readers queue behind it, so a steady stream of searches cannot starve an
+    ingest. Both sides are reentrant per thread, and a thread holding the
+    write lock may also read; upgrading a read lock to a write lock raises.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        held = getattr(self._local, "reads", 0)
+        with self._cond:
+            # nested reads and reads under our own write lock never wait
+            if not held and self._writer != me:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+            self._readers += 1
+        self._local.reads = held + 1
+
+    def release_read(self):
+        self._local.reads -= 1
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if getattr(self._local, "reads", 0):
+                raise RuntimeError("[RWLock] Cannot upgrade a read lock to a write lock.")
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,280 @@
+# utils/tracing.py
+# Lightweight spans, counters and memory high-water marks.
+#
+#   from utils.tracing import tracer
+#   with tracer.span("ingest.embed", doc_id=doc_id):
+#       ...
+#       tracer.count("chunks", len(chunks))
+#
+# Finished spans are appended to a JSONL trace file; aggregated span timings
+# and counters can be written as a Prometheus text snapshot. When disabled,
+# span() returns a shared no-op context manager and count() returns at once.
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _rss_bytes() -> int:
+    # current resident set size; Linux only, 0 elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _gpu_peak_bytes():
+    # only if torch is already loaded; tracing must not import it
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            return int(torch.cuda.max_memory_allocated())
+    except Exception:
+        pass
+    return None
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.counters = {}
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = None
+        self.trace_id = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.parent = stack[-1]
+            self.trace_id = self.parent.trace_id
+        else:
+            self.trace_id = self.span_id
+        stack.append(self)
+        self.rss_start = self.rss_peak = _rss_bytes()
+        self.tracer._open(self)
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        self.tracer._close(self)
+        rss_end = _rss_bytes()
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.wall,
+            "duration_s": duration,
+            "thread": threading.current_thread().name,
+            "rss_start_bytes": self.rss_start,
+            "rss_end_bytes": rss_end,
+            # highest RSS sampled while the span was open (process-wide, so it
+            # includes other threads); spans shorter than the interval get start/end
+            "rss_peak_bytes": max(self.rss_peak, rss_end),
+        }
+        gpu = _gpu_peak_bytes()
+        if gpu is not None:
+            record["gpu_peak_bytes"] = gpu
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.counters:
+            record["counters"] = self.counters
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.tracer._finish(record, is_root=self.parent is None)
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled: bool = config.TRACE_ENABLED, trace_path: str = config.TRACE_PATH,
+                 metrics_path: str = config.METRICS_PATH, rss_interval: float = config.TRACE_RSS_INTERVAL):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.rss_interval = rss_interval
+        self._open_spans = set()
+        self._spans_open = threading.Event()
+        self._sampler = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buffer = []
+        # span name -> [count, total seconds, max seconds]
+        self._span_stats = defaultdict(lambda: [0, 0.0, 0.0])
+        self._counters = defaultdict(float)
+
+    def configure(self, enabled: bool = None, trace_path: str = None, metrics_path: str = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if trace_path is not None:
+            self.trace_path = trace_path
+        if metrics_path is not None:
+            self.metrics_path = metrics_path
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _open(self, span):
+        with self._lock:
+            self._open_spans.add(span)
+            self._spans_open.set()
+            if self._sampler is None and self.rss_interval:
+                self._sampler = threading.Thread(target=self._sample_rss, name="trace-rss-sampler", daemon=True)
+                self._sampler.start()
+
+    def _close(self, span):
+        with self._lock:
+            self._open_spans.discard(span)
+            if not self._open_spans:
+                self._spans_open.clear()
+
+    def _sample_rss(self):
+        # raise the peak of every open span; idles while no span is open
+        while True:
+            self._spans_open.wait()
+            time.sleep(self.rss_interval)
+            rss = _rss_bytes()
+            with self._lock:
+                for span in self._open_spans:
+                    if rss > span.rss_peak:
+                        span.rss_peak = rss
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, attrs)
+
+    def current(self):
+        stack = self._stack() if self.enabled else None
+        return stack[-1] if stack else None
+
+    def count(self, name: str, value: float = 1):
+        """Add to a global counter and to the innermost open span."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] += value
+        stack = self._stack()
+        if stack:
+            counters = stack[-1].counters
+            counters[name] = counters.get(name, 0) + value
+
+    def _finish(self, record, is_root):
+        with self._lock:
+            stats = self._span_stats[record["name"]]
+            stats[0] += 1
+            stats[1] += record["duration_s"]
+            stats[2] = max(stats[2], record["duration_s"])
+            self._buffer.append(record)
+            # write a whole trace at once, or spill if nothing ever closes the root
+            if is_root or len(self._buffer) >= 1000:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer or not self.trace_path:
+            self._buffer = []
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+        with open(self.trace_path, "a", encoding="utf-8") as f:
+            for record in self._buffer:
+                f.write(json.dumps(record, default=str) + "\n")
+        self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def prometheus_text(self, prefix: str = "docinferx") -> str:
+        """Aggregated span timings, counters and memory as Prometheus exposition text."""
+        lines = []
+        with self._lock:
+            spans = {name: list(stats) for name, stats in self._span_stats.items()}
+            counters = dict(self._counters)
+        if spans:
+            lines.append(f"# TYPE {prefix}_span_seconds summary")
+            for name in sorted(spans):
+                count, total, _ = spans[name]
+                lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {count}')
+                lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f"# TYPE {prefix}_span_seconds_max gauge")
+            for name in sorted(spans):
+                lines.append(f'{prefix}_span_seconds_max{{span="{name}"}} {spans[name][2]:.6f}')
+        for name in sorted(counters):
+            metric = f"{prefix}_{name.replace('.', '_')}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {counters[name]:g}")
+        lines.append(f"# TYPE {prefix}_rss_bytes gauge")
+        lines.append(f"{prefix}_rss_bytes {_rss_bytes()}")
+        lines.append(f"# TYPE {prefix}_rss_peak_bytes gauge")
+        lines.append(f"{prefix}_rss_peak_bytes {_peak_rss_bytes()}")
+        gpu = _gpu_peak_bytes()
+        if gpu is not None:
+            lines.append(f"# TYPE {prefix}_gpu_peak_bytes gauge")
+            lines.append(f"{prefix}_gpu_peak_bytes {gpu}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path: str = None):
+        path = path or self.metrics_path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self._buffer = []
+            self._span_stats.clear()
+            self._counters.clear()
+
+
+# process-wide tracer used by the ingest and query paths
+tracer = Tracer()